@@ -8,17 +8,19 @@ from src.modules.notifier import Notifier
 from src.modules.watcher import Watcher
 from src.modules.listener import Listener
 from src.modules.gui import GUI
+from src.modules.timeline import Timeline
 
 
 def create_modules():
     """Create all modules but don't start them yet."""
+    timeline = Timeline()
     bot = Bot()
     capture = Capture()
     notifier = Notifier()
     listener = Listener()
     watcher = Watcher()
     
-    return bot, capture, notifier, listener, watcher
+    return timeline, bot, capture, notifier, listener, watcher
 
 
 def start_background_threads(gui):
@@ -27,7 +29,13 @@ def start_background_threads(gui):
     def start_threads():
         print('\n[~] Starting background threads...')
         
-        # Start capture first (bot depends on it)
+        # Start timeline first so that no events are missed
+        gui.timeline.start()
+        while not gui.timeline.ready:
+            time.sleep(0.01)
+        print('[~] Timeline ready')
+        
+        # Start capture next (bot depends on it)
         gui.capture.start()
         while not gui.capture.ready:
             time.sleep(0.01)
@@ -67,12 +75,13 @@ def main():
     """Main entry point with safe startup sequence."""
     
     # Create all modules first
-    bot, capture, notifier, listener, watcher = create_modules()
+    timeline, bot, capture, notifier, listener, watcher = create_modules()
     
     # Create GUI (this will set up Tkinter)
     gui = GUI()
     
     # Store modules in GUI for access by background threads
+    gui.timeline = timeline
     gui.bot = bot
     gui.capture = capture
     gui.notifier = notifier
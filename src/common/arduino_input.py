@@ -7,7 +7,7 @@ import serial
 import time
 import platform
 from typing import Optional
-from . import settings
+from . import settings, stats
 
 
 class ArduinoInput:
@@ -112,6 +112,7 @@ class ArduinoInput:
             key: Key name (e.g., 'a', 'space', 'enter', 'left', etc.)
             duration: How long to hold the key in seconds
         """
+        stats.increment(stats.INPUTS)
         # Map common key names to DirectInput scan codes
         key_mapping = {
             # Letters
@@ -155,6 +156,7 @@ class ArduinoInput:
     
     def key_down(self, key: str):
         """Hold down a key."""
+        stats.increment(stats.INPUTS)
         key_mapping = {
             # Letters
             'a': 0x1E, 'b': 0x30, 'c': 0x2E, 'd': 0x20, 'e': 0x12,
@@ -194,6 +196,7 @@ class ArduinoInput:
     
     def key_up(self, key: str):
         """Release a key."""
+        stats.increment(stats.INPUTS)
         key_mapping = {
             # Letters
             'a': 0x1E, 'b': 0x30, 'c': 0x2E, 'd': 0x20, 'e': 0x12,
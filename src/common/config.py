@@ -25,6 +25,10 @@ stage_fright = False
 # Represents the current shortest path that the bot is taking
 path = []
 
+# The reason the current routine element should be interrupted, such as 'rune', or None.
+# Set by other modules for high-priority events and cleared by the bot once handled
+preempt = None
+
 
 #############################
 #       Shared Modules      #
@@ -50,6 +54,9 @@ gui = None
 # Shares the webhook to all modules
 webhook = None
 
+# Shares the persistent event timeline
+timeline = None
+
 
 ##############################
 #       Watcher Flags        #
@@ -97,4 +104,7 @@ polo_portal = False
 especia_portal = False
 
 #Player in town
-in_town = False
\ No newline at end of file
+in_town = False
+
+# Routine cycles are taking much longer than usual
+routine_slow = False
\ No newline at end of file
@@ -1,5 +1,92 @@
 import os
+import time
 import pickle
+import threading
+from types import MappingProxyType
+
+
+class SettingsCache:
+    """
+    A process-wide cache of Configurable targets. Each target is unpickled once and handed
+    out as an immutable snapshot. A background thread watches the backing files and reloads
+    a target only when its modification time or size changes, and Configurable.save_config
+    replaces the snapshot directly, so readers never touch the disk in steady state.
+    """
+
+    POLL_INTERVAL = 1           # Seconds between checks of the backing files
+
+    def __init__(self):
+        self.entries = {}       # Maps each path to its [Configurable class, snapshot, file stamp]
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @staticmethod
+    def _stamp(path):
+        """Returns the (mtime, size) of the file at PATH, or None if it does not exist."""
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, cls, path):
+        """
+        Returns the current settings of CLS stored at PATH as a read-only mapping,
+        loading them on first use. If the file cannot be read, the defaults are used
+        until the background thread manages to read it.
+        """
+
+        entry = self.entries.get(path)
+        if entry is None:
+            with self.lock:
+                entry = self.entries.get(path)
+                if entry is None:
+                    stamp = SettingsCache._stamp(path)
+                    try:
+                        config = cls.read_config(path)
+                    except (OSError, EOFError, pickle.UnpicklingError) as e:
+                        print(f"[WARN] Failed to read settings at '{path}', using defaults: {e}")
+                        config = cls.DEFAULT_CONFIG.copy()
+                        stamp = None            # Makes the background thread retry
+                    entry = [cls, MappingProxyType(config), stamp]
+                    self.entries[path] = entry
+                    self._start()
+        return entry[1]
+
+    def update(self, path, config):
+        """Replaces the snapshot of the target at PATH with CONFIG, which was just saved."""
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                entry[1] = MappingProxyType(dict(config))
+                entry[2] = SettingsCache._stamp(path)
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._main)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _main(self):
+        while True:
+            time.sleep(SettingsCache.POLL_INTERVAL)
+            with self.lock:
+                items = list(self.entries.items())
+            for path, entry in items:
+                stamp = SettingsCache._stamp(path)
+                if stamp != entry[2]:
+                    try:
+                        config = entry[0].read_config(path)
+                    except (OSError, EOFError, pickle.UnpicklingError):
+                        continue            # Most likely caught mid-write, try again next time
+                    with self.lock:
+                        entry[1] = MappingProxyType(config)
+                        entry[2] = stamp
+
+
+SETTINGS_CACHE = SettingsCache()
 
 
 class Configurable:
@@ -16,12 +103,29 @@ class Configurable:
         self.config = self.DEFAULT_CONFIG.copy()        # Shallow copy, should only contain primitives
         self.load_config()
 
+    @classmethod
+    def read_config(cls, path):
+        """Returns the settings stored at PATH, or the defaults if there is no such file."""
+
+        if not os.path.isfile(path):
+            return cls.DEFAULT_CONFIG.copy()
+        with open(path, 'rb') as file:
+            loaded = pickle.load(file)
+        return {key: loaded.get(key, cls.DEFAULT_CONFIG[key]) for key in cls.DEFAULT_CONFIG}
+
+    @classmethod
+    def snapshot(cls, target, directory='.settings'):
+        """
+        Returns a cached, read-only view of the settings saved under TARGET. Cheap enough
+        to call from a bot loop, unlike constructing a new Configurable.
+        """
+
+        return SETTINGS_CACHE.get(cls, os.path.join(directory, target))
+
     def load_config(self):
         path = os.path.join(self.DIRECTORY, self.TARGET)
         if os.path.isfile(path):
-            with open(path, 'rb') as file:
-                loaded = pickle.load(file)
-                self.config = {key: loaded.get(key, '') for key in self.DEFAULT_CONFIG}
+            self.config = self.read_config(path)
         else:
             self.save_config()
 
@@ -32,6 +136,7 @@ class Configurable:
             os.makedirs(directory)
         with open(path, 'wb') as file:
             pickle.dump(self.config, file)
+        SETTINGS_CACHE.update(path, self.config)
 
     def get(self, key):
         return self.config[key]
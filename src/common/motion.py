@@ -0,0 +1,128 @@
+"""A fixed-size history of the player's recent positions and the motion statistics derived from it."""
+
+import time
+import threading
+import numpy as np
+from collections import namedtuple
+
+
+# Summary of the player's motion over a window of time. DISPLACEMENT is the straight-line
+# distance between the first and last positions, PATH_LENGTH is the total distance travelled,
+# and BBOX_AREA and BBOX_DIAGONAL describe the smallest box containing every position.
+MotionStats = namedtuple('MotionStats', ['samples', 'duration', 'displacement', 'path_length',
+                                         'bbox_area', 'bbox_diagonal', 'velocity'])
+
+EMPTY_STATS = MotionStats(0, 0.0, 0.0, 0.0, 0.0, 0.0, (0.0, 0.0))
+
+
+class MotionHistory:
+    """
+    A ring buffer of timestamped positions backed by preallocated numpy arrays. Positions
+    are appended by Capture each frame, and any thread can cheaply query motion statistics
+    over the most recent window of time.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Creates an empty MotionHistory.
+        :param capacity:    The maximum number of positions to remember.
+        """
+
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._positions = np.zeros((capacity, 2), dtype=np.float32)
+        self._count = 0         # Total number of positions ever appended
+        self._lock = threading.Lock()
+
+    def append(self, position, t=None):
+        """
+        Records POSITION as the player's location at time T, overwriting the oldest
+        entry once the buffer is full.
+        :param position:    The player's (x, y) position.
+        :param t:           The time of the sample, defaults to now.
+        :return:            None
+        """
+
+        with self._lock:
+            i = self._count % self.capacity
+            self._times[i] = time.time() if t is None else t
+            self._positions[i] = position
+            self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def window(self, seconds, now=None):
+        """
+        Returns copies of all samples recorded within the last SECONDS, oldest first.
+        :param seconds: The length of the window.
+        :param now:     The end of the window, defaults to now.
+        :return:        An array of times and an (N, 2) array of positions.
+        """
+
+        if now is None:
+            now = time.time()
+        with self._lock:
+            n = min(self._count, self.capacity)
+            start = self._count - n
+            indices = np.arange(start, self._count) % self.capacity
+            times = self._times[indices]
+            positions = self._positions[indices]
+        mask = times >= now - seconds
+        return times[mask], positions[mask]
+
+    def stats(self, seconds, now=None):
+        """Returns the MotionStats of all samples recorded within the last SECONDS."""
+
+        times, positions = self.window(seconds, now)
+        if len(times) < 2:
+            return EMPTY_STATS._replace(samples=len(times))
+
+        steps = np.diff(positions, axis=0)
+        path_length = float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+        dx, dy = positions[-1] - positions[0]
+        width, height = np.ptp(positions, axis=0)
+        duration = float(times[-1] - times[0])
+        if duration > 0:
+            velocity = (float(dx) / duration, float(dy) / duration)
+        else:
+            velocity = (0.0, 0.0)
+        return MotionStats(
+            samples=len(times),
+            duration=duration,
+            displacement=float(np.hypot(dx, dy)),
+            path_length=path_length,
+            bbox_area=float(width * height),
+            bbox_diagonal=float(np.hypot(width, height)),
+            velocity=velocity
+        )
+
+    def velocity(self, seconds=0.3):
+        """Returns the player's average (x, y) velocity in minimap units per second."""
+
+        return self.stats(seconds).velocity
+
+    def is_stationary(self, seconds, tolerance):
+        """
+        Returns whether the player stayed within a box of diagonal TOLERANCE for the entire
+        last SECONDS. Returns False if the history does not yet cover the window.
+        """
+
+        stats = self.stats(seconds)
+        return stats.duration >= 0.9 * seconds and stats.bbox_diagonal <= tolerance
+
+    def is_oscillating(self, seconds, tolerance, ratio=4):
+        """
+        Returns whether the player has been moving back and forth within a small area for the
+        last SECONDS, i.e. travelled at least RATIO times further than the size of the area
+        while never leaving a box of diagonal TOLERANCE.
+        """
+
+        stats = self.stats(seconds)
+        return stats.duration >= 0.9 * seconds and \
+            0 < stats.bbox_diagonal <= tolerance and \
+            stats.path_length >= ratio * stats.bbox_diagonal
+
+    def __len__(self):
+        return min(self._count, self.capacity)
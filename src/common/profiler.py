@@ -0,0 +1,173 @@
+"""
+Records how long every routine Component and Command takes to execute. Records are kept
+in a preallocated ring buffer and can be exported as Chrome trace events, which can be
+opened in chrome://tracing or https://ui.perfetto.dev, or summarized per class.
+Profiling is controlled by the 'profile' routine setting and costs a single attribute
+lookup per Component when it is off.
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from datetime import datetime
+from src.common import config
+
+
+PROFILE_DIR = '.profiles'
+CAPACITY = 16384            # Number of most recent records that are kept
+
+# Outcomes
+COMPLETED = 0
+PREEMPTED = 1               # Interrupted by a high-priority event
+FAILED = 2                  # Raised an exception
+
+OUTCOMES = ('completed', 'preempted', 'failed')
+
+
+class Profiler:
+    """A ring buffer of (class, start, end, outcome, depth) records."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._starts = np.zeros(capacity, dtype=np.float64)
+        self._ends = np.zeros(capacity, dtype=np.float64)
+        self._names = np.zeros(capacity, dtype=np.int32)
+        self._outcomes = np.zeros(capacity, dtype=np.int8)
+        self._depths = np.zeros(capacity, dtype=np.int8)
+        self._count = 0             # Total number of records ever added
+        self.names = []             # Class names, indexed by the values in _names
+        self._name_ids = {}
+        self.depth = 0              # How many profiled Components are currently executing
+        self._lock = threading.Lock()
+
+    def run(self, component):
+        """Executes COMPONENT's main function and records how long it took."""
+
+        depth = self.depth
+        self.depth += 1
+        outcome = FAILED
+        start = time.perf_counter()
+        try:
+            component.main()
+            outcome = PREEMPTED if config.preempt is not None else COMPLETED
+        finally:
+            self.depth = depth
+            self.record(component.__class__.__name__, start, time.perf_counter(), outcome, depth)
+
+    def record(self, name, start, end, outcome, depth=0):
+        """
+        Adds a record, overwriting the oldest one once the buffer is full.
+        :param name:    The name of the Component's class.
+        :param start:   When it started executing, in time.perf_counter() seconds.
+        :param end:     When it finished executing.
+        :param outcome: One of COMPLETED, PREEMPTED or FAILED.
+        :param depth:   How many other Components it was nested in, such as a Point.
+        :return:        None
+        """
+
+        with self._lock:
+            name_id = self._name_ids.get(name)
+            if name_id is None:
+                name_id = len(self.names)
+                self._name_ids[name] = name_id
+                self.names.append(name)
+            i = self._count % self.capacity
+            self._starts[i] = start
+            self._ends[i] = end
+            self._names[i] = name_id
+            self._outcomes[i] = outcome
+            self._depths[i] = depth
+            self._count += 1
+
+    def records(self):
+        """Returns copies of the starts, ends, name indices, outcomes and depths of every record, oldest first."""
+
+        with self._lock:
+            n = min(self._count, self.capacity)
+            indices = np.arange(self._count - n, self._count) % self.capacity
+            return (self._starts[indices], self._ends[indices], self._names[indices],
+                    self._outcomes[indices], self._depths[indices])
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def chrome_trace(self):
+        """Returns every record as a Chrome trace-event JSON object."""
+
+        starts, ends, names, outcomes, depths = self.records()
+        origin = starts.min() if len(starts) else 0
+        events = []
+        for start, end, name, outcome, depth in zip(starts.tolist(), ends.tolist(), names.tolist(),
+                                                    outcomes.tolist(), depths.tolist()):
+            events.append({
+                'name': self.names[name],
+                'cat': 'routine',
+                'ph': 'X',
+                'ts': (start - origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': 1,
+                'tid': 1,
+                'args': {'outcome': OUTCOMES[outcome], 'depth': depth}
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def summary(self):
+        """
+        Returns statistics on the duration of each class of Component.
+        :return:    A dictionary mapping each class name to its count, total seconds,
+                    median and 95th percentile seconds, and number of preempted or
+                    failed executions, sorted by total time spent.
+        """
+
+        starts, ends, names, outcomes, _ = self.records()
+        durations = ends - starts
+        result = {}
+        for name_id in np.unique(names).tolist():
+            mask = names == name_id
+            d = durations[mask]
+            result[self.names[name_id]] = {
+                'count': int(mask.sum()),
+                'total': float(d.sum()),
+                'p50': float(np.percentile(d, 50)),
+                'p95': float(np.percentile(d, 95)),
+                'interrupted': int((outcomes[mask] != COMPLETED).sum())
+            }
+        return dict(sorted(result.items(), key=lambda item: -item[1]['total']))
+
+    def format_summary(self):
+        """Returns the summary as a table."""
+
+        lines = [f"{'class':<20}{'count':>8}{'total':>10}{'p50':>10}{'p95':>10}{'interrupted':>13}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<20}{s['count']:>8}{s['total']:>9.1f}s{s['p50'] * 1000:>8.0f}ms"
+                         f"{s['p95'] * 1000:>8.0f}ms{s['interrupted']:>13}")
+        return '\n'.join(lines)
+
+    def dump(self, name='routine'):
+        """
+        Writes every record to a Chrome trace file in PROFILE_DIR, prints the per-class
+        summary and clears the buffer.
+        :param name:    Prefixes the name of the trace file, such as the routine's name.
+        :return:        The path to the trace file, or None if there was nothing to dump.
+        """
+
+        if len(self) == 0:
+            return None
+        if not os.path.exists(PROFILE_DIR):
+            os.makedirs(PROFILE_DIR)
+        path = os.path.join(PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+        print(f"\n[~] Profiled {len(self)} execution(s), trace saved to '{path}':")
+        print(self.format_summary())
+        self.clear()
+        return path
+
+
+PROFILER = Profiler()
@@ -0,0 +1,171 @@
+"""
+A central scheduler for periodic bot maintenance tasks such as feeding pets and using buffs.
+Tasks are kept in one heap per policy, so the bot can check whether anything is due in
+constant time before each routine element.
+"""
+
+import heapq
+import random
+import threading
+import time
+
+
+# Policies that decide when a due task is allowed to run
+ELEMENT = 'element'         # Between any two routine elements
+CYCLE = 'cycle'             # Only once the routine wraps back to its first element
+
+POLICIES = (ELEMENT, CYCLE)
+
+
+class Task:
+    """A function that the Scheduler runs every INTERVAL seconds."""
+
+    def __init__(self, name, function, interval, jitter, policy, delay=None):
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.jitter = jitter
+        self.policy = policy
+        self.delay = delay          # Seconds until the first run, or None to wait one interval
+        self.enabled = True
+        self.due = 0
+        self.registered = time.time()
+        self.last_run = None
+        self.version = 0            # Heap entries with an older version are stale
+
+
+class Scheduler:
+    """Keeps registered Tasks ordered by when they are next due. Safe to use from any thread."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.heaps = {policy: [] for policy in POLICIES}
+        self.counter = 0            # Breaks ties between Tasks due at the same time
+        self.lock = threading.Lock()
+
+    def register(self, name, function, interval, jitter=0, policy=ELEMENT, delay=None):
+        """
+        Adds a periodic task, replacing any existing task with the same NAME.
+        :param name:        Identifies the task.
+        :param function:    Called with no arguments whenever the task runs.
+        :param interval:    Seconds between runs.
+        :param jitter:      Each run is randomly moved up to this many seconds earlier or later.
+        :param policy:      One of POLICIES.
+        :param delay:       Seconds until the first run, defaults to INTERVAL.
+        :return:            The new Task.
+        """
+
+        assert policy in POLICIES, f"'{policy}' is not a valid scheduling policy"
+        task = Task(name, function, interval, jitter, policy, delay)
+        with self.lock:
+            old = self.tasks.get(name)
+            if old is not None:
+                old.version += 1
+            self.tasks[name] = task
+            self._push(task, task.registered + (interval if delay is None else delay))
+        return task
+
+    def unregister(self, name):
+        with self.lock:
+            task = self.tasks.pop(name, None)
+            if task is not None:
+                task.version += 1
+
+    def set_enabled(self, name, enabled):
+        """Pauses or resumes the task NAME. A resumed task runs immediately if it became due while paused."""
+
+        with self.lock:
+            task = self.tasks[name]
+            if enabled == task.enabled:
+                return
+            task.enabled = enabled
+            if enabled:
+                self._push(task, task.due)
+            else:
+                task.version += 1
+
+    def set_interval(self, name, interval):
+        """
+        Changes how often the task NAME runs, counting from its last run. A task that has
+        not run yet keeps its explicit first delay, or is otherwise due one new interval
+        after it was registered.
+        """
+
+        with self.lock:
+            task = self.tasks[name]
+            if interval == task.interval:
+                return
+            task.interval = interval
+            if task.last_run is not None:
+                due = task.last_run + interval
+            elif task.delay is not None:
+                due = task.registered + task.delay
+            else:
+                due = task.registered + interval
+            task.version += 1
+            if task.enabled:
+                self._push(task, due)
+            else:
+                task.due = due
+
+    def _push(self, task, due):
+        task.due = due
+        task.version += 1
+        self.counter += 1
+        heapq.heappush(self.heaps[task.policy], (due, self.counter, task.version, task))
+
+    def _top(self, heap):
+        """Discards stale entries and returns the earliest valid entry in HEAP, or None."""
+
+        while heap:
+            entry = heap[0]
+            task = entry[3]
+            if entry[2] == task.version and self.tasks.get(task.name) is task:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+    def pop_due(self, policies=(ELEMENT,), now=None):
+        """
+        Returns the earliest due task allowed by POLICIES and schedules its next run.
+        :param policies:    The policies whose tasks may run at this point of the routine.
+        :param now:         The current time, defaults to now.
+        :return:            The due Task, or None if nothing is due.
+        """
+
+        if now is None:
+            now = time.time()
+        with self.lock:
+            best = None
+            for policy in policies:
+                entry = self._top(self.heaps[policy])
+                if entry is not None and entry[0] <= now and (best is None or entry < best):
+                    best = entry
+            if best is None:
+                return None
+            task = best[3]
+            heapq.heappop(self.heaps[task.policy])
+            task.last_run = now
+            jitter = random.uniform(-task.jitter, task.jitter) if task.jitter else 0
+            self._push(task, now + max(0, task.interval + jitter))
+            return task
+
+    def run_due(self, policies=(ELEMENT,)):
+        """Runs every task allowed by POLICIES that is currently due."""
+
+        task = self.pop_due(policies)
+        while task is not None:
+            try:
+                task.function()
+            except Exception as e:
+                print(f"[WARN] Scheduled task '{task.name}' failed: {e}")
+            task = self.pop_due(policies)
+
+    def time_until(self, name):
+        """Returns the number of seconds until the task NAME is next due, or None if it is paused."""
+
+        with self.lock:
+            task = self.tasks.get(name)
+            if task is None or not task.enabled:
+                return None
+            return max(0, task.due - time.time())
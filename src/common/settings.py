@@ -70,6 +70,11 @@ SETTING_VALIDATORS = {
     'move_tolerance': float,
     'adjust_tolerance': float,
     'record_layout': validate_boolean,
+    'learned_costs': validate_boolean,
+    'control_rate': float,
+    'profile': validate_boolean,
+    'precompute_paths': validate_boolean,
+    'watcher_process': validate_boolean,
     'buff_cooldown': validate_nonnegative_int
 }
 
@@ -77,7 +82,8 @@ SETTING_VALIDATORS = {
 def reset():
     """Resets all settings to their default values."""
 
-    global move_tolerance, adjust_tolerance, record_layout, buff_cooldown
+    global move_tolerance, adjust_tolerance, record_layout, learned_costs, control_rate, buff_cooldown
+    global profile, precompute_paths, watcher_process
     global arduino_port, arduino_baud
     global maple_window_left, maple_window_top, maple_window_width, maple_window_height
     global use_manual_window_position, use_hotkey_window_selection
@@ -85,7 +91,12 @@ def reset():
     move_tolerance = 0.075
     adjust_tolerance = 0.01
     record_layout = False
+    learned_costs = False
+    control_rate = 10
     buff_cooldown = 180
+    profile = False
+    precompute_paths = False
+    watcher_process = False
     
     # Arduino Configuration
     arduino_port = "/dev/cu.usbmodemHIDPC1"
@@ -111,9 +122,24 @@ adjust_tolerance = 0.01
 # Whether the bot should save new player positions to the current layout
 record_layout = False
 
+# Whether paths should be planned by the travel times learned from previous moves, rather than by distance
+learned_costs = False
+
+# The maximum number of movement decisions per second that Move makes, each based on a fresh frame
+control_rate = 10
+
 # The amount of time (in seconds) to wait between each call to the 'buff' command
 buff_cooldown = 180
 
+# Whether to record how long each routine component takes, dumping a trace whenever the bot is paused
+profile = False
+
+# Whether to plan and cache the path between every pair of consecutive Points when a routine loads
+precompute_paths = False
+
+# Whether to run the watcher's template scans in a separate process
+watcher_process = False
+
 # === Arduino Configuration ===
 # Serial port for Arduino (auto-detected if None)
 arduino_port = "/dev/cu.usbmodemHIDPC1"
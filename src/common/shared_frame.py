@@ -0,0 +1,81 @@
+"""A single video frame in shared memory that one process writes and others can read without pickling."""
+
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class SharedFrame:
+    """
+    Holds the most recent frame in a block of shared memory. The block starts with a small
+    header of (sequence, height, width, channels) followed by the raw pixel data. The writer
+    makes the sequence number odd while it is copying a frame in and even once it is done,
+    so readers can detect and retry torn reads without any locking.
+    """
+
+    HEADER_SIZE = 4         # Number of int64 values in the header
+
+    def __init__(self, name=None, capacity=0):
+        """
+        Creates a new shared block large enough for CAPACITY bytes of pixels if NAME is None,
+        otherwise attaches to the existing block called NAME.
+        :param name:        The name of an existing SharedFrame to attach to.
+        :param capacity:    The size of the largest frame this SharedFrame can hold, in bytes.
+        """
+
+        header_bytes = SharedFrame.HEADER_SIZE * np.dtype(np.int64).itemsize
+        if name is None:
+            self.owner = True
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + capacity)
+        else:
+            self.owner = False
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = self.shm.size - header_bytes
+        self.header = np.ndarray((SharedFrame.HEADER_SIZE,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((self.capacity,), dtype=np.uint8,
+                               buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+
+    def write(self, frame):
+        """
+        Copies FRAME into shared memory.
+        :param frame:   A uint8 image of shape (height, width, channels).
+        :return:        Whether FRAME fit into this SharedFrame.
+        """
+
+        if frame.nbytes > self.capacity:
+            return False
+        height, width, channels = frame.shape
+        self.header[0] += 1                 # Odd while writing
+        self.header[1:] = (height, width, channels)
+        self.data[:frame.nbytes] = frame.reshape(-1)
+        self.header[0] += 1                 # Even once consistent
+        return True
+
+    def read(self, last_seq=-1):
+        """
+        Returns a private copy of the current frame if it is newer than LAST_SEQ.
+        :param last_seq:    The sequence number of the last frame the caller has seen.
+        :return:            The (sequence number, frame) pair, with frame being None if no
+                            new, consistent frame is available.
+        """
+
+        seq = int(self.header[0])
+        if seq == last_seq or seq == 0 or seq % 2 == 1:
+            return last_seq, None
+        height, width, channels = (int(x) for x in self.header[1:])
+        size = height * width * channels
+        frame = self.data[:size].copy().reshape((height, width, channels))
+        if int(self.header[0]) != seq:      # Overwritten while copying
+            return last_seq, None
+        return seq, frame
+
+    def close(self):
+        """Detaches from the shared block, destroying it if this is the SharedFrame that created it."""
+
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
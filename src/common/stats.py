@@ -0,0 +1,117 @@
+"""
+Thread-safe running counters describing the current run, such as routine cycles, rune solves
+and input commands. Modules update them as events happen, and the notifier periodically
+collects and resets them to build a digest, so nothing ever has to re-scan a log.
+"""
+
+import time
+import threading
+
+
+# Counter names
+CYCLES = 'cycles'
+RUNES_SOLVED = 'runes_solved'
+RUNES_FAILED = 'runes_failed'
+FRAMES = 'frames'
+INPUTS = 'inputs'
+
+
+class RunStats:
+    """Counters and flag durations accumulated since they were last collected."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._flag_counts = {}          # Number of times each flag was raised
+        self._flag_durations = {}       # Total seconds each flag stayed raised
+        self._raised = {}               # Maps each currently raised flag to when it was raised
+        self._since = time.time()
+
+    def increment(self, name, n=1):
+        """Adds N to the counter NAME."""
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def flag(self, name, raised, t=None):
+        """
+        Records that the flag NAME was raised or cleared at time T.
+        :param name:    The name of the flag.
+        :param raised:  Whether the flag is now raised.
+        :param t:       The time of the transition, defaults to now.
+        :return:        None
+        """
+
+        if t is None:
+            t = time.time()
+        with self._lock:
+            if raised:
+                if name not in self._raised:
+                    self._raised[name] = t
+                    self._flag_counts[name] = self._flag_counts.get(name, 0) + 1
+            elif name in self._raised:
+                start = max(self._raised.pop(name), self._since)
+                self._flag_durations[name] = self._flag_durations.get(name, 0) + t - start
+
+    def collect(self, now=None):
+        """
+        Returns everything accumulated since the last call and starts a new interval.
+        Flags that are still raised carry over, with the time so far counted in this interval.
+        :return:    A dictionary with the interval's 'start', 'duration', 'counters' and
+                    'flags', the last being a dictionary of (times raised, seconds raised) pairs.
+        """
+
+        if now is None:
+            now = time.time()
+        with self._lock:
+            durations = self._flag_durations
+            for name, start in self._raised.items():
+                durations[name] = durations.get(name, 0) + now - max(start, self._since)
+            flags = {name: (self._flag_counts.get(name, 0), durations.get(name, 0))
+                     for name in set(self._flag_counts) | set(durations)}
+            result = {
+                'start': self._since,
+                'duration': now - self._since,
+                'counters': self._counters,
+                'flags': flags
+            }
+            self._counters = {}
+            self._flag_counts = {}
+            self._flag_durations = {}
+            self._since = now
+        return result
+
+
+RUN_STATS = RunStats()
+
+
+def increment(name, n=1):
+    RUN_STATS.increment(name, n)
+
+
+def flag(name, raised):
+    RUN_STATS.flag(name, raised)
+
+
+def collect():
+    return RUN_STATS.collect()
+
+
+def format_digest(digest):
+    """Returns a compact, human-readable summary of a digest returned by collect()."""
+
+    counters = digest['counters']
+    duration = digest['duration']
+    minutes = duration / 60
+    fps = counters.get(FRAMES, 0) / duration if duration > 0 else 0
+    lines = [
+        f'Run digest for the last {minutes:.0f} min:',
+        f'Cycles: {counters.get(CYCLES, 0)}, '
+        f'runes solved: {counters.get(RUNES_SOLVED, 0)}, failed: {counters.get(RUNES_FAILED, 0)}',
+        f'Capture: {fps:.1f} FPS, inputs sent: {counters.get(INPUTS, 0)}'
+    ]
+    flags = sorted(digest['flags'].items(), key=lambda item: -item[1][1])
+    if flags:
+        lines.append('Flags: ' + ', '.join(f'{name} {count}x ({seconds:.0f}s)'
+                                           for name, (count, seconds) in flags))
+    return '\n'.join(lines)
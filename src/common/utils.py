@@ -101,6 +101,7 @@ def draw_location(img, location, color):
         print(f"[WARN] Failed to draw location: {e}")
 
 import math
+import time
 import queue
 import cv2
 import threading
@@ -122,6 +123,39 @@ def run_if_enabled(function):
     return helper
 
 
+def request_preemption(reason):
+    """
+    Asks the bot to interrupt the routine element it is executing as soon as possible,
+    so that it can handle a high-priority event.
+    :param reason:  Describes the event, such as 'rune' or 'character_dead'.
+    :return:        None
+    """
+
+    if config.enabled and config.preempt is None:
+        config.preempt = reason
+
+
+def preempted():
+    """Returns whether the current routine element has been asked to yield."""
+
+    return config.preempt is not None
+
+
+def preemptible_sleep(duration, interval=0.02):
+    """
+    Sleeps for DURATION seconds, waking up early if the bot is paused or preempted.
+    :return:    Whether the full duration elapsed.
+    """
+
+    end = time.time() + duration
+    while config.enabled and config.preempt is None:
+        remaining = end - time.time()
+        if remaining <= 0:
+            return True
+        time.sleep(min(interval, remaining))
+    return False
+
+
 def run_if_disabled(message=''):
     """
     Decorator for functions that should only run while the bot is disabled. If MESSAGE
@@ -193,6 +227,40 @@ def filter_color(img, ranges):
     return result
 
 
+def encode_image(img, roi=None, max_width=None, fmt='jpg', quality=80):
+    """
+    Crops, downscales and compresses IMG entirely in memory.
+    :param img:         A BGR image, such as Capture.frame.
+    :param roi:         An optional (left, top, right, bottom) region to keep, given as
+                        fractions of the image's width and height.
+    :param max_width:   Images wider than this are downscaled, keeping their aspect ratio.
+    :param fmt:         Either 'jpg' or 'webp'.
+    :param quality:     The encoder quality, from 1 to 100.
+    :return:            The encoded bytes, or None if encoding failed.
+    """
+
+    if roi is not None:
+        height, width = img.shape[:2]
+        left, top, right, bottom = roi
+        img = img[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+    if max_width and img.shape[1] > max_width:
+        scale = max_width / img.shape[1]
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if img.ndim == 3 and img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+    quality = max(1, min(100, int(quality)))
+    if fmt == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        fmt = 'jpg'
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    success, buffer = cv2.imencode(f'.{fmt}', img, params)
+    if not success:
+        return None
+    return buffer.tobytes()
+
+
 def print_separator():
     """Prints a 3 blank lines for visual clarity."""
 
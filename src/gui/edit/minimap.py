@@ -3,7 +3,7 @@ import cv2
 from PIL import ImageTk, Image
 from src.common import config, utils
 from src.routine.components import Point
-from src.gui.interfaces import LabelFrame
+from src.gui.interfaces import LabelFrame, MinimapOverlay
 
 
 class Minimap(LabelFrame):
@@ -17,6 +17,7 @@ class Minimap(LabelFrame):
                                 borderwidth=0, highlightthickness=0)
         self.canvas.pack(expand=True, fill='both', padx=5, pady=5)
         self.container = None
+        self.overlay = MinimapOverlay(points=False, geometry=True)
 
         self.draw_default()
 
@@ -66,8 +67,7 @@ class Minimap(LabelFrame):
     def draw(self, img):
         """Draws IMG onto the Canvas."""
 
-        if config.layout:
-            config.layout.draw(img)     # Display the current Layout
+        self.overlay.composite(img)     # Display the current Layout and its platforms and ropes
 
         img = ImageTk.PhotoImage(Image.fromarray(img))
         if self.container is None:
@@ -2,9 +2,11 @@
 
 import tkinter as tk
 import platform
+import numpy as np
 from tkinter import ttk
-from src.common import utils
+from src.common import config, utils
 from src.common.interfaces import Configurable
+from src.routine.components import Point
 
 
 class Frame(tk.Frame):
@@ -33,6 +35,59 @@ class MenuBarItem(tk.Menu):
         parent.add_cascade(label=label, menu=self)
 
 
+class MinimapOverlay:
+    """
+    The static markings on a minimap, namely the current Layout and optionally the
+    routine's Points or the Layout's platforms and ropes, rendered once into an RGBA image
+    at the canvas resolution. The image is only re-rendered when the Layout or routine
+    changes or the canvas is resized.
+    """
+
+    def __init__(self, points=True, geometry=False):
+        """
+        :param points:      Whether to draw the routine's Points in addition to the Layout.
+        :param geometry:    Whether to draw the platforms and ropes extracted from the Layout.
+        """
+
+        self.points = points
+        self.geometry = geometry
+        self.key = None
+        self.image = None
+
+    def get(self, shape):
+        """Returns the overlay for a minimap image of the given SHAPE, re-rendering it if stale."""
+
+        height, width = shape[:2]
+        layout = config.layout
+        routine = config.routine if self.points else None
+        graph = layout.map_graph if self.geometry and layout is not None else None
+        key = (width, height,
+               layout, layout.version if layout is not None else None, graph,
+               routine, routine.version if routine is not None else None,
+               config.enabled)
+        if key != self.key:
+            image = np.zeros((height, width, 4), dtype=np.uint8)
+            if graph is not None:
+                graph.draw(image, (0, 191, 255, 160), (255, 0, 255, 160))
+            if routine is not None:
+                color = (0, 255, 0, 255) if config.enabled else (255, 0, 0, 255)
+                for p in routine.sequence:
+                    if isinstance(p, Point):
+                        utils.draw_location(image, p.location, color)
+            if layout is not None:
+                layout.draw(image, (255, 165, 0, 255))
+            self.image = image
+            self.key = key
+        return self.image
+
+    def composite(self, img):
+        """Alpha-blends this overlay onto the RGB image IMG in place."""
+
+        overlay = self.get(img.shape)
+        alpha = overlay[..., 3:].astype(np.uint16)
+        img[:] = (img * (255 - alpha) + overlay[..., :3] * alpha + 127) // 255
+
+
 class KeyBindings(LabelFrame):
     def __init__(self, parent, label, target, **kwargs):
         super().__init__(parent, label, **kwargs)
@@ -22,6 +22,9 @@ class Notification_Target(LabelFrame):
         self.notif_settings_root = NotifSettings('Notifier Settings')
         self.webhook_url = tk.StringVar(value=self.notif_settings_root.get('WebhookURL'))
         self.timezone = tk.StringVar(value=self.notif_settings_root.get('Timezone'))
+        self.image_format = tk.StringVar(value=self.notif_settings_root.get('ImageFormat'))
+        self.image_quality = tk.IntVar(value=self.notif_settings_root.get('ImageQuality'))
+        self.digest_missed = tk.BooleanVar(value=self.notif_settings_root.get('DigestMissed'))
 
         self.discordWebhookLabel = tk.Label(self, text="Discord Webhook URL")
         self.discordWebhookLabel.grid(row = 0, column = 0, sticky=tk.NSEW, padx=5, pady=5)
@@ -34,11 +37,31 @@ class Notification_Target(LabelFrame):
         self.discordTimezoneEntry.bind("<KeyRelease>",self._on_change)
         self.discordTimezoneEntry.grid(row = 1, column = 1, sticky=tk.NSEW, padx=5, pady=5)
 
-        self.testMessage = tk.Button(self, text="Send Test Notification", command=self._send_test_notification).grid(row = 2, column=0, columnspan=2, padx=5, pady=5)
+        self.imageFormatLabel = tk.Label(self, text="Screenshot Format")
+        self.imageFormatLabel.grid(row = 2, column = 0, sticky=tk.NSEW, padx=5, pady=5)
+        self.imageFormatMenu = tk.OptionMenu(self, self.image_format, 'jpg', 'webp', command=self._on_change)
+        self.imageFormatMenu.grid(row = 2, column = 1, sticky=tk.W, padx=5, pady=5)
+        self.imageQualityLabel = tk.Label(self, text="Screenshot Quality (1-100)")
+        self.imageQualityLabel.grid(row = 3, column = 0, sticky=tk.NSEW, padx=5, pady=5)
+        self.imageQualityEntry = tk.Spinbox(self, from_=1, to=100, textvariable=self.image_quality, command=self._on_change)
+        self.imageQualityEntry.bind("<KeyRelease>",self._on_change)
+        self.imageQualityEntry.grid(row = 3, column = 1, sticky=tk.W, padx=5, pady=5)
+
+        self.digestCheck = tk.Checkbutton(self, text="Merge notifications missed while offline into digests",
+                                          variable=self.digest_missed, command=self._on_change)
+        self.digestCheck.grid(row = 4, column = 0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+
+        self.testMessage = tk.Button(self, text="Send Test Notification", command=self._send_test_notification).grid(row = 5, column=0, columnspan=2, padx=5, pady=5)
 
     def _on_change(self, *args):
         self.notif_settings_root.set('WebhookURL', self.webhook_url.get())
         self.notif_settings_root.set('Timezone', self.timezone.get())
+        self.notif_settings_root.set('ImageFormat', self.image_format.get())
+        self.notif_settings_root.set('DigestMissed', self.digest_missed.get())
+        try:
+            self.notif_settings_root.set('ImageQuality', self.image_quality.get())
+        except tk.TclError:         # Entry is empty or not a number while being edited
+            pass
         self.notif_settings_root.save_config()
 
     def _send_test_notification(self):
@@ -49,6 +72,9 @@ class Notification_Target(LabelFrame):
 class NotifSettings(Configurable):
     DEFAULT_CONFIG = {
         'WebhookURL': 'NULL',
-        'Timezone': 'UTC'
+        'Timezone': 'UTC',
+        'ImageFormat': 'jpg',
+        'ImageQuality': 80,
+        'DigestMissed': True
     }
     
\ No newline at end of file
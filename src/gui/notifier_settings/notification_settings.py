@@ -32,6 +32,10 @@ class Notification_Settings(LabelFrame):
         self.playerStuckToggle = tk.BooleanVar(value=self.notification_setting_root.get("player_stuck_toggle"))
         self.playerEspeciaNotice = tk.StringVar(value=self.notification_setting_root.get("especia_portal_notice"))
         self.playerEspeciaToggle = tk.BooleanVar(value=self.notification_setting_root.get("especia_portal_toggle"))
+        self.routineSlowNotice = tk.StringVar(value=self.notification_setting_root.get("routine_slow_notice"))
+        self.routineSlowToggle = tk.BooleanVar(value=self.notification_setting_root.get("routine_slow_toggle"))
+        self.digestToggle = tk.BooleanVar(value=self.notification_setting_root.get("digest_toggle"))
+        self.digestInterval = tk.IntVar(value=self.notification_setting_root.get("digest_interval"))
         self.notif_suppression = tk.BooleanVar(value=self.notification_setting_root.get('Suppress_All'))
 
         #Define layout
@@ -162,6 +166,26 @@ class Notification_Settings(LabelFrame):
         n11.grid(row=12, column=1, sticky=tk.NSEW, padx=5, pady=5)
         n11.bind("<KeyRelease>",self._on_change)
 
+        tk.Checkbutton(
+            self,
+            variable=self.routineSlowToggle,
+            text="Routine Slowed Down",
+            command=self._on_change
+        ).grid(row=13, column=0, sticky=tk.W, padx=5, pady=5)
+        n13=tk.Entry(self, textvariable=self.routineSlowNotice)
+        n13.grid(row=13, column=1, sticky=tk.NSEW, padx=5, pady=5)
+        n13.bind("<KeyRelease>",self._on_change)
+
+        tk.Checkbutton(
+            self,
+            variable=self.digestToggle,
+            text="Run Digest (minutes)",
+            command=self._on_change
+        ).grid(row=14, column=0, sticky=tk.W, padx=5, pady=5)
+        n12=tk.Entry(self, textvariable=self.digestInterval)
+        n12.grid(row=14, column=1, sticky=tk.NSEW, padx=5, pady=5)
+        n12.bind("<KeyRelease>",self._on_change)
+
         muteAll_check = tk.Checkbutton(
             self,
             variable=self.notif_suppression,
@@ -195,6 +219,13 @@ class Notification_Settings(LabelFrame):
         self.notification_setting_root.set('especia_portal_toggle', self.playerEspeciaToggle.get())
         self.notification_setting_root.set('char_in_town_notice', self.playerEspeciaNotice.get())
         self.notification_setting_root.set('char_in_town_toggle', self.playerEspeciaToggle.get())
+        self.notification_setting_root.set('routine_slow_notice', self.routineSlowNotice.get())
+        self.notification_setting_root.set('routine_slow_toggle', self.routineSlowToggle.get())
+        self.notification_setting_root.set('digest_toggle', self.digestToggle.get())
+        try:
+            self.notification_setting_root.set('digest_interval', max(1, self.digestInterval.get()))
+        except tk.TclError:     #interval is empty or not a number while being edited
+            pass
         self.notification_setting_root.set('Suppress_All', self.notif_suppression.get())    
         self.notification_setting_root.save_config()
 
@@ -225,5 +256,9 @@ class NotificationSetting(Configurable):
         'player_stuck_toggle': False,
         'especia_portal_notice': 'NULL',
         'especia_portal_toggle': False,
+        'routine_slow_notice': 'NULL',
+        'routine_slow_toggle': False,
+        'digest_toggle': False,
+        'digest_interval': 60,
         'Suppress_All': False
     }
\ No newline at end of file
@@ -2,9 +2,8 @@ import cv2
 import tkinter as tk
 from tkinter.font import Font
 from PIL import ImageTk, Image
-from src.gui.interfaces import LabelFrame
+from src.gui.interfaces import LabelFrame, MinimapOverlay
 from src.common import config, utils
-from src.routine.components import Point
 
 
 class Minimap(LabelFrame):
@@ -23,6 +22,7 @@ class Minimap(LabelFrame):
                                 )
         minimap_desc.pack()
         self.container = None
+        self.overlay = MinimapOverlay()
 
     def display_minimap(self):
         """Updates the Main page with the current minimap."""
@@ -59,16 +59,8 @@ class Minimap(LabelFrame):
                     end = utils.convert_to_absolute(path[i + 1], img)
                     cv2.line(img, start, end, (0, 255, 255), 1)
 
-            # Draw each Point in the routine as a circle
-            for p in config.routine.sequence:
-                if isinstance(p, Point):
-                    utils.draw_location(img,
-                                        p.location,
-                                        (0, 255, 0) if config.enabled else (255, 0, 0))
-
-            # Display the current Layout
-            if config.layout:
-                config.layout.draw(img)
+            # Draw each Point in the routine as a circle and display the current Layout
+            self.overlay.composite(img)
 
             # Draw other players (blue circles)
             others_pos = minimap.get('others_pos', [])
@@ -1,4 +1,5 @@
 import tkinter as tk
+from src.common import config
 from src.gui.interfaces import LabelFrame
 
 
@@ -41,6 +42,23 @@ class MonitoringConsole(LabelFrame):
         self.v4_entry = tk.Entry(self, textvariable=self.noOthers, state=tk.DISABLED)
         self.v4_entry.grid(row=4,column=2, padx=(0, 5), pady=(5, 0), sticky=tk.EW)
 
+        self.after(1000, self._refresh_countdowns)
+
+
+    def _refresh_countdowns(self):
+        """Shows the time left until the bot's next scheduled EXP buff and CS reset."""
+
+        if config.bot is not None and hasattr(config.bot, 'scheduler'):
+            self.set_nextexpbuffstat(self._format_countdown(config.bot.scheduler.time_until('exp_buff')))
+            self.set_nextcsresetstat(self._format_countdown(config.bot.scheduler.time_until('cs_reset')))
+        self.after(1000, self._refresh_countdowns)
+
+    @staticmethod
+    def _format_countdown(seconds):
+        if seconds is None:
+            return "Disabled"
+        minutes, seconds = divmod(int(seconds), 60)
+        return f"{minutes:02d}:{seconds:02d}"
 
     def set_enabledstat(self, string):
         if string == 1:
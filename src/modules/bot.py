@@ -9,14 +9,20 @@ import importlib
 import traceback
 from src.common.arduino_input import press
 from os.path import splitext, basename
-from src.common import config, utils
+from src.common import config, utils, scheduler
+from src.common.scheduler import Scheduler
 from src.routine import components
 from src.routine.routine import Routine
+from src.routine.prefetch import PathPrefetcher
 from src.command_book.command_book import CommandBook
 from src.routine.components import Point
 from src.common.interfaces import Configurable
+from src.gui.settings.pets import PetSettings
+from src.gui.settings.expbuffsettings import ExpSettings
+from src.gui.settings.miscsettings import MiscSettings
 from src.runesolvercore.runesolver import enterCashshop
-import numpy as np
+from src.modules import timeline
+from src.common import stats
 
 # Import the RuneSolver class functionality
 import src.runesolvercore.runesolver as runesolver
@@ -28,6 +34,8 @@ RUNE_BUFF_TEMPLATE = cv2.imread('assets/rune_buff_template.jpg', 0)
 class Bot(Configurable):
     """A class that interprets and executes user-defined routines."""
 
+    FEED_PETS_INTERVAL = 1200
+
     DEFAULT_CONFIG = {
         'NPC/Gather': 'y',
         'Feed pet': '9',
@@ -52,7 +60,18 @@ class Bot(Configurable):
         self.submodules = []
         self.command_book = None            # CommandBook instance
         
-        # Cached settings to avoid Tkinter threading issues
+        # Plans the path to the next Point while the current one runs
+        self.prefetcher = PathPrefetcher()
+        
+        # Periodic maintenance tasks, paused until enabled in the settings
+        self.scheduler = Scheduler()
+        self.scheduler.register('feed_pets', self.feed_pets, Bot.FEED_PETS_INTERVAL)
+        self.scheduler.register('exp_buff', self._use_exp_buff, 60, delay=0)
+        self.scheduler.register('cs_reset', self._cs_reset, 60)
+        for name in ('feed_pets', 'exp_buff', 'cs_reset'):
+            self.scheduler.set_enabled(name, False)
+        
+        # Cached settings, read from snapshots to avoid Tkinter threading issues
         self.cached_settings = {
             'auto_feed': False,
             'num_pets': 1,
@@ -62,9 +81,6 @@ class Bot(Configurable):
             'cs_reset_interval': 1
         }
         
-        self.last_settings_update = 0
-        self.settings_update_interval = 5  # Update settings every 5 seconds
-        
         self.ready = False
         self.thread = threading.Thread(target=self._main)
         self.thread.daemon = True
@@ -81,31 +97,44 @@ class Bot(Configurable):
         # Don't set command_book here - it will be set when load_commands is called
         
         # Start main thread
+        self.prefetcher.start()
         t = threading.Thread(target=self._main, daemon=True)
         t.start()
 
     def _update_settings_cache(self):
-        """Update cached settings from the GUI to avoid threading issues."""
-        try:
-            if hasattr(config, 'gui') and config.gui:
-                # Access settings through the correct GUI structure
-                if hasattr(config.gui, 'settings'):
-                    # Access pet settings
-                    if hasattr(config.gui.settings, 'pets'):
-                        self.cached_settings['auto_feed'] = config.gui.settings.pets.auto_feed.get()
-                        self.cached_settings['num_pets'] = config.gui.settings.pets.num_pets.get()
-                    
-                    # Access exp buff settings
-                    if hasattr(config.gui.settings, 'expbuffsettings'):
-                        self.cached_settings['auto_buff_exp'] = config.gui.settings.expbuffsettings.expbuff_use_toggle.get()
-                        self.cached_settings['expbuff_use_interval'] = config.gui.settings.expbuffsettings.expbuff_use_interval.get()
-                    
-                    # Access misc settings
-                    if hasattr(config.gui.settings, 'miscsettings'):
-                        self.cached_settings['cs_reset_toggle'] = config.gui.settings.miscsettings.cs_reset_toggle.get()
-                        self.cached_settings['cs_reset_interval'] = config.gui.settings.miscsettings.cs_reset_interval.get()
-        except Exception as e:
-            print(f"[WARN] Failed to update settings cache: {e}")
+        """Refreshes the cached settings from the shared settings snapshots without touching Tkinter."""
+        pets = PetSettings.snapshot('pets')
+        expbuff = ExpSettings.snapshot('EXP Buff Settings')
+        misc = MiscSettings.snapshot('Misc. Settings')
+        self.cached_settings['auto_feed'] = pets['Auto-feed']
+        self.cached_settings['num_pets'] = pets['Num pets']
+        self.cached_settings['auto_buff_exp'] = expbuff['expbuff_use']
+        self.cached_settings['expbuff_use_interval'] = expbuff['expbuff_use_interval']
+        self.cached_settings['cs_reset_toggle'] = misc['cs_reset']
+        self.cached_settings['cs_reset_interval'] = misc['cs_reset_interval']
+
+    def _update_schedule(self):
+        """Applies the cached settings to the periodic maintenance tasks."""
+        self.scheduler.set_enabled('feed_pets', bool(self.cached_settings['auto_feed']))
+        self.scheduler.set_interval('exp_buff', self.cached_settings['expbuff_use_interval'] * 60)
+        self.scheduler.set_enabled('exp_buff', bool(self.cached_settings['auto_buff_exp']))
+        self.scheduler.set_interval('cs_reset', self.cached_settings['cs_reset_interval'] * 60)
+        self.scheduler.set_enabled('cs_reset', bool(self.cached_settings['cs_reset_toggle']))
+
+    def _use_exp_buff(self):
+        if hasattr(self, 'buff') and self.buff:
+            # Use the buff command from command book if available
+            if hasattr(self.buff, 'main'):
+                self.buff.main()
+            else:
+                print("[WARN] Buff command not properly initialized")
+
+    def _cs_reset(self):
+        config.enabled = False
+        time.sleep(1)
+        runesolver.enterCashshop()
+        time.sleep(1)
+        config.enabled = True
 
     def _main(self):
         """
@@ -114,47 +143,16 @@ class Bot(Configurable):
         """
         self.ready = True
         config.listener.enabled = True
-        last_fed = time.time()
-        last_enteredCS = time.time()
-        last_30m_expbuffed = None
         
         while True:
             if config.enabled and len(config.routine) > 0:
-                # Update settings cache periodically
-                now = time.time()
-                if now - self.last_settings_update > self.settings_update_interval:
-                    if hasattr(config, 'gui') and config.gui:
-                        config.gui.root.after_idle(self._update_settings_cache)
-                    self.last_settings_update = now
+                # Snapshots are cached in memory, so this is cheap enough to do every iteration
+                self._update_settings_cache()
+                self._update_schedule()
                 
-                # Auto-feed pets
-                if self.cached_settings['auto_feed'] and now - last_fed > 1200:
-                    last_fed = now
-                    self.feed_pets()
-                
-                # Auto buff EXP
-                if self.cached_settings['auto_buff_exp']:
-                    expbuff_interval = self.cached_settings['expbuff_use_interval'] * 60  # Convert to seconds
-                    
-                    if last_30m_expbuffed is None or (now - last_30m_expbuffed) >= expbuff_interval:
-                        last_30m_expbuffed = now
-                        if hasattr(self, 'buff') and self.buff:
-                            # Use the buff command from command book if available
-                            if hasattr(self.buff, 'main'):
-                                self.buff.main()
-                            else:
-                                print("[WARN] Buff command not properly initialized")
-                
-                # CS reset functionality
-                if self.cached_settings['cs_reset_toggle']:
-                    cs_reset_interval = self.cached_settings['cs_reset_interval'] * 60
-                    if now - last_enteredCS > cs_reset_interval:
-                        last_enteredCS = now
-                        config.enabled = False
-                        time.sleep(1)
-                        runesolver.enterCashshop()
-                        time.sleep(1)
-                        config.enabled = True
+                # Run any periodic maintenance task that is due
+                policies = (scheduler.ELEMENT, scheduler.CYCLE) if config.routine.index == 0 else (scheduler.ELEMENT,)
+                self.scheduler.run_due(policies)
                 
                 # Execute routine sequence
                 self._execute_routine_sequence()
@@ -165,30 +163,60 @@ class Bot(Configurable):
     def _execute_routine_sequence(self):
         """Execute the routine sequence with rune detection (original approach)."""
         # Highlight the current Point in GUI
-        config.gui.root.after(0, config.gui.view.routine.select, config.routine.index)
-        config.gui.root.after(0, config.gui.view.details.display_info, config.routine.index)
+        config.gui.post('routine_select', config.gui.view.routine.select, config.routine.index)
+        config.gui.post('routine_details', config.gui.view.details.display_info, config.routine.index)
         
         # Get current routine element
         element = config.routine[config.routine.index]
         
         # Check for rune before executing the routine element
         if not config.rune_cd and self._should_solve_rune():
-            # Calculate distance to rune from all routine points
-            distances = [utils.distance(self.rune_pos, config.routine[i].location) 
-                        for i in range(len(config.routine))]
-            closest_index = np.argmin(distances)
-            self.rune_closest_pos = config.routine[closest_index].location
+            # Find the routine Point closest to the rune
+            closest = config.routine.nearest_point(self.rune_pos)
+            if closest is not None:
+                self.rune_closest_pos = closest[1].location
             
-            # If we're at the closest point to the rune, solve it
-            if isinstance(element, Point) and element.location == self.rune_closest_pos:
-                self._solve_rune()
+                # If we're at the closest point to the rune, solve it
+                if isinstance(element, Point) and element.location == self.rune_closest_pos:
+                    self._solve_rune()
+        
+        # Plan the move after this one while this element runs
+        if isinstance(element, Point):
+            next_point = config.routine.next_point(config.routine.index)
+            if next_point is not None:
+                self.prefetcher.prefetch(element.location, next_point.location)
         
         # Execute the routine element
         element.execute()
         
+        # If the element was interrupted, handle the event and run the same element again
+        if config.preempt is not None:
+            reason = config.preempt
+            self._handle_preemption(reason)
+            config.preempt = None
+            return
+        
         # Step to next routine element
         config.routine.step()
 
+    def _handle_preemption(self, reason):
+        """
+        Reacts to the high-priority event that interrupted the current routine element.
+        :param reason:  The reason given to utils.request_preemption.
+        :return:        None
+        """
+        print(f"[~] Routine element interrupted: {reason}")
+        if reason == 'rune':
+            # Continue from the Point closest to the rune, which solves it before moving on
+            if not config.rune_cd and self._should_solve_rune():
+                closest = config.routine.nearest_point(self.rune_pos)
+                if closest is not None:
+                    config.routine.index = closest[0]
+        elif reason in ('character_dead', 'lie_detector_failed'):
+            # Hold the routine until the notifier's automation or the user resolves it
+            while config.enabled and getattr(config, reason):
+                time.sleep(0.1)
+
     def _should_solve_rune(self):
         """Check if we should solve a rune (original approach - direct capture check)."""
         try:
@@ -250,6 +278,8 @@ class Bot(Configurable):
         
         solver_instance = RuneSolverConfig(self.config)
         result = runesolver.solve_rune_raw(solver_instance)
+        timeline.record(timeline.RUNE, 'solve', int(bool(result)))
+        stats.increment(stats.RUNES_SOLVED if result else stats.RUNES_FAILED)
         
         if result:
             print("Rune solved successfully!")
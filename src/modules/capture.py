@@ -9,7 +9,8 @@ import threading
 import time
 import os
 import platform
-from src.common import config, utils
+from src.common import config, utils, stats
+from src.common.motion import MotionHistory
 
 # Load template files with error handling
 def load_template_safe(path):
@@ -71,6 +72,10 @@ class Capture:
         self.minimap_sample = None
         self.minimap_ratio = 1.333
         self.minimap = {}
+        self.motion = MotionHistory()       # Recent player positions, shared with other modules
+        self.shared_frame = None            # Mirrors each frame into shared memory if set
+        self.frame_time = 0                 # When the most recently processed frame was captured
+        self.frame_condition = threading.Condition()    # Notified whenever a frame is processed
         
         self.window = {
             'left': 0, 'top': 0,
@@ -87,6 +92,18 @@ class Capture:
         t = threading.Thread(target=self._main, daemon=True)
         t.start()
 
+    def wait_for_frame(self, since, timeout):
+        """
+        Blocks until a frame captured after time SINCE has been processed, so that
+        config.player_pos reflects everything that happened before SINCE.
+        :param since:   The time that the frame must be captured after.
+        :param timeout: The maximum number of seconds to wait.
+        :return:        Whether such a frame arrived in time.
+        """
+
+        with self.frame_condition:
+            return self.frame_condition.wait_for(lambda: self.frame_time > since, timeout)
+
     def _load_saved_window_config(self):
         """Load saved window configuration from window_config.json"""
         try:
@@ -385,10 +402,15 @@ class Capture:
                 self.window['height'] = max(rect[3] - rect[1], MMT_HEIGHT)
 
             # Take screenshot
+            captured = time.time()
             with mss.mss() as self.sct:
                 self.frame = self.screenshot()
             if self.frame is None:
                 continue
+            stats.increment(stats.FRAMES)
+            shared = self.shared_frame      # The Watcher may swap it out between frames
+            if shared is not None:
+                shared.write(self.frame)
                 
             # Calibrate minimap if not already calibrated
             if not self.calibrated:
@@ -414,6 +436,8 @@ class Capture:
                 
                 # Detect player position
                 if self._detect_player(minimap_gray):
+                    self.motion.append(config.player_pos)
+
                     # Detect runes
                     rune_active, rune_pos = self._detect_runes(minimap_gray)
                     
@@ -429,5 +453,9 @@ class Capture:
                         'others_pos': config.others_pos,
                         'path': config.path if hasattr(config, 'path') else []
                     }
+
+                with self.frame_condition:
+                    self.frame_time = captured
+                    self.frame_condition.notify_all()
                 
             time.sleep(0.1)  # 10 FPS
@@ -0,0 +1,465 @@
+"""
+Delivers outbound notifications on a dedicated thread so that a slow or failing webhook
+never stalls the modules that raise them. Messages are queued, coalesced with duplicates,
+rate limited per destination and retried with exponential backoff. Messages that still
+cannot be delivered are kept in an on-disk spool until the destination recovers.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import uuid
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlsplit
+
+
+SPOOL_DIR = '.spool'
+SPOOL_FILE = 'notifications.db'
+
+# Outcomes of a delivery attempt
+SENT = 'sent'
+REJECTED = 'rejected'           # The destination refused the message, it will never succeed
+RETRY = 'retry'                 # The destination could not be reached, try again later
+
+
+def get_spool_path():
+    return os.path.join(SPOOL_DIR, SPOOL_FILE)
+
+
+class Message:
+    """A single outbound notification."""
+
+    def __init__(self, url, content=None, file=None, key=None):
+        """
+        :param url:     The webhook to deliver to.
+        :param content: The text of the message.
+        :param file:    An optional (filename, bytes) attachment.
+        :param key:     Messages with the same URL and KEY are considered duplicates.
+                        Defaults to CONTENT. Messages with attachments are never coalesced.
+        """
+
+        self.url = url
+        self.content = content
+        self.file = file
+        self.key = None if file is not None else (url, content if key is None else key)
+        self.count = 1
+        self.attempts = 0
+
+    def text(self):
+        """Returns the content of this Message, noting how many duplicates were folded into it."""
+
+        if self.count > 1:
+            return f'{self.content} (x{self.count})'
+        return self.content
+
+
+class TokenBucket:
+    """Allows RATE events per second on average, with bursts of up to CAPACITY events."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def delay(self):
+        """Returns how many seconds to wait before the next event is allowed."""
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class WebhookTransport:
+    """Posts messages to webhooks, keeping one connection alive per host."""
+
+    TIMEOUT = 10
+
+    def __init__(self):
+        self.connections = {}
+
+    def _connection(self, parts):
+        key = (parts.scheme, parts.netloc)
+        if key not in self.connections:
+            if parts.scheme == 'https':
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=WebhookTransport.TIMEOUT)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=WebhookTransport.TIMEOUT)
+            self.connections[key] = conn
+        return self.connections[key]
+
+    def _drop(self, parts):
+        conn = self.connections.pop((parts.scheme, parts.netloc), None)
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def _encode(message):
+        """Returns the body and content type of the request that delivers MESSAGE."""
+
+        payload = json.dumps({'content': message.text()} if message.content else {})
+        if message.file is None:
+            return payload.encode('utf-8'), 'application/json'
+
+        filename, data = message.file
+        boundary = uuid.uuid4().hex
+        body = b''.join((
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="payload_json"\r\n',
+            b'Content-Type: application/json\r\n\r\n',
+            payload.encode('utf-8'), b'\r\n',
+            f'--{boundary}\r\n'.encode(),
+            f'Content-Disposition: form-data; name="files[0]"; filename="{filename}"\r\n'.encode(),
+            b'Content-Type: application/octet-stream\r\n\r\n',
+            data, b'\r\n',
+            f'--{boundary}--\r\n'.encode()
+        ))
+        return body, f'multipart/form-data; boundary={boundary}'
+
+    def post(self, message):
+        """
+        Delivers MESSAGE, reconnecting once if the kept-alive connection was closed.
+        :return:    The response's status code, headers and body.
+        """
+
+        parts = urlsplit(message.url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        body, content_type = WebhookTransport._encode(message)
+        for attempt in range(2):
+            conn = self._connection(parts)
+            try:
+                conn.request('POST', path, body=body, headers={'Content-Type': content_type})
+                response = conn.getresponse()
+                return response.status, dict(response.getheaders()), response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._drop(parts)
+                if attempt == 1:
+                    raise
+            except Exception:
+                self._drop(parts)
+                raise
+
+
+class Spool:
+    """
+    A bounded, on-disk queue of messages that could not be delivered. Only the rows being
+    flushed are ever held in memory, so an outage of any length costs a fixed amount of it.
+    """
+
+    MAX_ROWS = 1000             # The oldest messages are dropped beyond this
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS spool (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        t           REAL NOT NULL,
+        url         TEXT NOT NULL,
+        content     TEXT,
+        key         TEXT,
+        count       INTEGER NOT NULL DEFAULT 1,
+        filename    TEXT,
+        data        BLOB
+    );
+    """
+
+    def __init__(self, path=None, digest=False):
+        """
+        Opens the spool at PATH, creating it if necessary.
+        :param path:    The path to the spool database.
+        :param digest:  If True, duplicates of a spooled message only increase its count.
+        """
+
+        self.path = path or get_spool_path()
+        self.digest = digest
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(Spool.SCHEMA)
+        self.count = self.conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def put(self, message):
+        """Stores MESSAGE until it can be delivered."""
+
+        key = None if message.key is None else str(message.key[1])
+        with self.conn:
+            if self.digest and key is not None:
+                cursor = self.conn.execute(
+                    'UPDATE spool SET count = count + ?, t = ? WHERE url = ? AND key = ?',
+                    (message.count, time.time(), message.url, key)
+                )
+                if cursor.rowcount > 0:
+                    return
+            filename, data = message.file if message.file is not None else (None, None)
+            self.conn.execute(
+                'INSERT INTO spool (t, url, content, key, count, filename, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), message.url, message.content, key, message.count, filename, data)
+            )
+            self.count += 1
+            if self.count > Spool.MAX_ROWS:
+                excess = self.count - Spool.MAX_ROWS
+                self.conn.execute('DELETE FROM spool WHERE id IN '
+                                  '(SELECT id FROM spool ORDER BY id LIMIT ?)', (excess,))
+                self.count = Spool.MAX_ROWS
+                print(f'[WARN] Notification spool is full, dropped the {excess} oldest message(s)')
+
+    def peek(self, n):
+        """Returns up to N of the oldest spooled messages as (id, Message) pairs."""
+
+        rows = self.conn.execute(
+            'SELECT id, url, content, key, count, filename, data FROM spool ORDER BY id LIMIT ?', (n,)
+        ).fetchall()
+        result = []
+        for id, url, content, key, count, filename, data in rows:
+            message = Message(url, content, None if filename is None else (filename, data), key)
+            message.count = count
+            result.append((id, message))
+        return result
+
+    def remove(self, ids):
+        """Deletes the spooled messages with the given IDS."""
+
+        with self.conn:
+            self.conn.executemany('DELETE FROM spool WHERE id = ?', ((i,) for i in ids))
+        self.count = self.conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+
+class Dispatcher:
+    """
+    A bounded outbound queue drained by a single sender thread. Exposes the same send()
+    call as discord's SyncWebhook, but returns immediately.
+    """
+
+    MAX_QUEUE = 100             # The oldest messages are dropped beyond this
+    COALESCE_WINDOW = 30        # Seconds during which duplicates of a sent message are dropped
+    RATE = 0.5                  # Messages per second allowed to each destination
+    BURST = 5                   # Messages that can be sent back to back to each destination
+    BACKOFF_START = 1
+    BACKOFF_MAX = 60
+    MAX_ATTEMPTS = 5
+    FLUSH_INTERVAL = 30         # Seconds between attempts to drain the spool while offline
+    FLUSH_BATCH = 20            # Spooled messages read from disk at a time
+    DIGEST_LENGTH = 1900        # Longest digest message, Discord allows 2000 characters
+
+    def __init__(self, url, transport=None, spool=None):
+        """
+        Creates a Dispatcher that delivers to URL by default.
+        :param url:         The default webhook URL.
+        :param transport:   An object with a post(message) method, for testing.
+        :param spool:       An optional Spool that keeps undeliverable messages until
+                            the destination recovers.
+        """
+
+        parts = urlsplit(url or '')
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError(f"'{url}' is not a valid webhook URL")
+        self.url = url
+        self.transport = transport or WebhookTransport()
+        self.spool = spool
+        self.offline = False        # Whether the last delivery failed, new messages are spooled if so
+        self.next_flush = 0
+        self.queue = deque()
+        self.pending = {}           # Maps the key of each queued Message to that Message
+        self.recent = {}            # Maps the key of each recently sent Message to when it was sent
+        self.buckets = {}
+        self.condition = threading.Condition()
+        self.stats = {'sent': 0, 'coalesced': 0, 'dropped': 0, 'failed': 0, 'spooled': 0}
+        self.ready = False
+        self.thread = threading.Thread(target=self._main)
+        self.thread.daemon = True
+
+    def start(self):
+        """Starts this Dispatcher's sender thread."""
+
+        self.thread.start()
+
+    def send(self, content=None, file=None, key=None, url=None):
+        """
+        Queues a message for delivery. Safe to call from any thread.
+        :param content: The text of the message.
+        :param file:    An optional (filename, bytes) attachment.
+        :param key:     Identifies duplicate messages, defaults to CONTENT.
+        :param url:     The webhook to deliver to, defaults to this Dispatcher's URL.
+        :return:        None
+        """
+
+        message = Message(url or self.url, content, file, key)
+        with self.condition:
+            if message.key is not None:
+                if message.key in self.pending:
+                    self.pending[message.key].count += 1
+                    self.stats['coalesced'] += 1
+                    return
+                sent = self.recent.get(message.key)
+                if sent is not None and time.monotonic() - sent < Dispatcher.COALESCE_WINDOW:
+                    self.stats['coalesced'] += 1
+                    return
+                self.pending[message.key] = message
+            if len(self.queue) >= Dispatcher.MAX_QUEUE:
+                self._forget(self.queue.popleft())
+                self.stats['dropped'] += 1
+            self.queue.append(message)
+            self.condition.notify()
+
+    def _forget(self, message):
+        if message.key is not None and self.pending.get(message.key) is message:
+            del self.pending[message.key]
+
+    def _main(self):
+        self.ready = True
+        while True:
+            message = None
+            with self.condition:
+                if not self.queue:
+                    timeout = None
+                    if self.spool is not None and self.spool.count:
+                        timeout = max(0, self.next_flush - time.monotonic())
+                    self.condition.wait(timeout)
+                if self.queue:
+                    message = self.queue.popleft()
+                    self._forget(message)
+            if message is not None:
+                if self.offline and self.spool is not None:
+                    self._store(message)            # Keeps messages in order until the flush succeeds
+                elif self._deliver(message) == RETRY:
+                    self._store(message)
+            if self.spool is not None and self.spool.count and time.monotonic() >= self.next_flush:
+                self._flush()
+
+    def _store(self, message):
+        """Spools MESSAGE if there is a spool, otherwise gives up on it."""
+
+        if self.spool is None:
+            self.stats['failed'] += 1
+            return
+        try:
+            self.spool.put(message)
+            self.stats['spooled'] += 1
+        except sqlite3.Error as e:
+            print(f'[WARN] Failed to spool notification: {e}')
+            self.stats['failed'] += 1
+        if not self.offline:
+            print('[WARN] Notifications are unreachable, spooling messages until they recover')
+            self.offline = True
+            self.next_flush = time.monotonic() + Dispatcher.FLUSH_INTERVAL
+
+    def _flush(self):
+        """Delivers a batch of spooled messages, stopping at the first one that fails."""
+
+        batch = self.spool.peek(Dispatcher.FLUSH_BATCH)
+        done = []
+        for ids, message in self._digests(batch):
+            message.attempts = Dispatcher.MAX_ATTEMPTS - 1      # One attempt per flush
+            result = self._deliver(message)
+            if result == RETRY:
+                self.offline = True
+                self.next_flush = time.monotonic() + Dispatcher.FLUSH_INTERVAL
+                break
+            done.extend(ids)
+        if done:
+            self.spool.remove(done)
+        if len(done) == len(batch):
+            if self.offline:
+                print('[~] Notifications recovered, delivering spooled messages')
+            self.offline = False
+            self.next_flush = 0
+
+    def _digests(self, batch):
+        """
+        Groups a batch of spooled (id, Message) pairs into the messages to deliver. If the
+        spool merges duplicates, consecutive text messages to the same destination are also
+        combined into a single digest.
+        :return:    A list of (ids, Message) pairs.
+        """
+
+        if not self.spool.digest:
+            return [([id], message) for id, message in batch]
+        result = []
+        lines, ids, url = [], [], None
+        for id, message in batch + [(None, None)]:
+            text = None if message is None or message.file is not None else message.text()
+            if lines and (text is None or message.url != url or
+                          sum(len(l) + 1 for l in lines) + len(text) > Dispatcher.DIGEST_LENGTH):
+                digest = Message(url, '\n'.join(['Missed while offline:'] + lines))
+                result.append((ids, digest))
+                lines, ids = [], []
+            if message is None:
+                break
+            if text is None:
+                result.append(([id], message))
+            else:
+                lines.append(text)
+                ids.append(id)
+                url = message.url
+        return result
+
+    def _bucket(self, url):
+        if url not in self.buckets:
+            self.buckets[url] = TokenBucket(Dispatcher.RATE, Dispatcher.BURST)
+        return self.buckets[url]
+
+    def _deliver(self, message):
+        """
+        Sends MESSAGE, retrying with exponential backoff until it succeeds or gives up.
+        :return:    SENT, REJECTED, or RETRY if the destination could not be reached.
+        """
+
+        bucket = self._bucket(message.url)
+        backoff = Dispatcher.BACKOFF_START
+        while message.attempts < Dispatcher.MAX_ATTEMPTS:
+            time.sleep(bucket.delay())
+            bucket.take()
+            message.attempts += 1
+            try:
+                status, headers, body = self.transport.post(message)
+            except Exception as e:
+                print(f'[WARN] Failed to send notification: {e}')
+            else:
+                if 200 <= status < 300:
+                    self._sent(message)
+                    return SENT
+                if status == 429:           # Rate limited by the destination, not a failure
+                    message.attempts -= 1
+                    time.sleep(Dispatcher._retry_after(headers, body, backoff))
+                    continue
+                if status < 500:
+                    print(f'[WARN] Notification rejected with status {status}: {body[:200]!r}')
+                    self.stats['failed'] += 1
+                    return REJECTED
+                print(f'[WARN] Notification failed with status {status}')
+            if message.attempts < Dispatcher.MAX_ATTEMPTS:
+                time.sleep(backoff)
+                backoff = min(2 * backoff, Dispatcher.BACKOFF_MAX)
+        return RETRY
+
+    def _sent(self, message):
+        with self.condition:
+            self.stats['sent'] += 1
+            if message.key is not None:
+                now = time.monotonic()
+                self.recent[message.key] = now
+                for key in [k for k, t in self.recent.items() if now - t >= Dispatcher.COALESCE_WINDOW]:
+                    del self.recent[key]
+
+    @staticmethod
+    def _retry_after(headers, body, default):
+        """Returns how long the destination asked us to wait, in seconds."""
+
+        try:
+            return float(json.loads(body)['retry_after'])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(headers.get('Retry-After', default))
+        except ValueError:
+            return default
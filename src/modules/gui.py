@@ -7,9 +7,11 @@ from tkinter import ttk
 from src.common import config, settings
 from src.gui import Menu, View, Edit, Settings, Notifer_Settings, Runtime_Flags, Automation_Settings
 from src.gui.menu.file import Import_Settings
+from src.routine.layout import Layout, compact_current
 
 class GUI:
     DISPLAY_FRAME_RATE = 30
+    UPDATE_RATE = 20            # Times per second that updates posted by other threads are applied
     RESOLUTIONS = {
         'DEFAULT': '800x800',
         'Edit': '1300x750',
@@ -41,6 +43,10 @@ class GUI:
         # Initialize GUI variables
         self.routine_var = tk.StringVar()
 
+        # Latest update posted for each key by worker threads, applied by _pump_updates
+        self.updates = {}
+        self.updates_lock = threading.Lock()
+
         # Build the GUI
         self.menu = Menu(self.root)
         self.root.config(menu=self.menu)
@@ -58,6 +64,32 @@ class GUI:
         self.navigation.bind('<<NotebookTabChanged>>', self._resize_window)
         self.root.focus()
 
+    def post(self, key, callback, *args):
+        """
+        Schedules CALLBACK(*ARGS) to run on the Tkinter thread. Safe to call from any thread.
+        Only the most recent update posted under each KEY is applied, and pending updates are
+        applied together UPDATE_RATE times per second, so the number of Tkinter callbacks stays
+        bounded no matter how often workers post.
+        :param key:         Identifies the widget or value being updated.
+        :param callback:    The function that updates the GUI.
+        :return:            None
+        """
+
+        with self.updates_lock:
+            self.updates[key] = (callback, args)
+
+    def _pump_updates(self):
+        """Applies every pending update on the Tkinter thread, then reschedules itself."""
+
+        with self.updates_lock:
+            updates, self.updates = self.updates, {}
+        for key, (callback, args) in updates.items():
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"[WARN] Failed to apply GUI update '{key}': {e}")
+        self.root.after(1000 // GUI.UPDATE_RATE, self._pump_updates)
+
     def set_routine(self, arr):
         self.routine_var.set(arr)
 
@@ -105,6 +137,9 @@ class GUI:
     def start(self):
         """Starts the GUI as well as any scheduled functions."""
 
+        # Start applying updates posted by other threads
+        self.root.after(0, self._pump_updates)
+
         # Start GUI background threads using Tkinter's after() for thread safety
         self.root.after(200, self._start_background_threads)
 
@@ -133,11 +168,18 @@ class GUI:
             time.sleep(delay)
 
     def _save_layout(self):
-        """Periodically saves the current Layout object."""
+        """Periodically appends newly recorded points to the current Layout's point log."""
 
         while True:
-            if config.layout is not None and settings.record_layout:
-                config.layout.save()
+            layout = config.layout
+            if layout is not None:
+                try:
+                    if settings.record_layout and \
+                            layout.size - layout.compacted_size >= Layout.RECOMPACT_GROWTH:
+                        layout = compact_current() or layout
+                    layout.flush()
+                except OSError as e:
+                    print(f"[WARN] Failed to save layout '{layout.name}': {e}")
             time.sleep(5)
 
     def _load_previous_config(self):
@@ -7,9 +7,10 @@ import sys
 import time
 import threading
 import platform
-from src.common import config, utils
+from src.common import config, settings, utils, profiler
 from src.common.interfaces import Configurable
 from datetime import datetime
+from os.path import splitext, basename
 
 # Cross-platform keyboard input handling for HOTKEYS ONLY
 if platform.system() == "Darwin":  # macOS
@@ -155,8 +156,12 @@ class Listener(Configurable):
             Listener.recalibrate_minimap()      # Recalibrate only when being enabled.
 
         config.enabled = not config.enabled
-        config.gui.root.after(0, config.gui.view.monitoringconsole.set_enabledstat, config.enabled)
+        config.gui.post('enabled_stat', config.gui.view.monitoringconsole.set_enabledstat, config.enabled)
         utils.print_state()
+        if not config.enabled:
+            config.routine.interrupt_cycle()
+            if settings.profile:
+                profiler.PROFILER.dump(splitext(basename(config.routine.path))[0] or 'routine')
 
         # Cross-platform sound
         if platform.system() == "Darwin":  # macOS
@@ -210,7 +215,7 @@ class Listener(Configurable):
         config.capture.calibrated = False
         while not config.capture.calibrated:
             time.sleep(0.01)
-        config.gui.root.after(0, config.gui.edit.minimap.redraw)
+        config.gui.post('edit_minimap', config.gui.edit.minimap.redraw)
 
     @staticmethod
     def record_position():
@@ -1,6 +1,6 @@
 from src.common.interfaces import Configurable
 import threading
-from discord import SyncWebhook, File
+import sqlite3
 import time
 from datetime import datetime
 import pytz
@@ -8,10 +8,21 @@ from src.gui.notifier_settings.main import NotifSettings
 from src.gui.notifier_settings.notification_settings import NotificationSetting
 from src.gui.automation.main import AutomationParams
 import src.common.config as config
+from src.common import utils, stats
 import pyautogui
 import cv2
 from pathlib import Path
 import src.modules.automation as automation
+from src.modules.dispatcher import Dispatcher, Spool
+
+# Flags whose alerts come with a screenshot, mapped to the (left, top, right, bottom) region
+# of the frame that shows what happened, as fractions of its size. None sends the whole frame.
+SCREENSHOT_ROIS = {
+    "chatbox_msg": (0, 0.6, 0.5, 1),
+    "character_dead": None,
+    "lie_detector_failed": None
+}
+MAX_SCREENSHOT_WIDTH = 960
 
 class Notifier:
     def __init__(self):
@@ -28,9 +39,17 @@ class Notifier:
         self.ready = True
         self.lastAlertTimeDict = {}
         self.watchlist = {} 
+        self.lastDigestTime = time.time()
         try:
-            config.webhook = SyncWebhook.from_url(NotifSettings('Notifier Settings').get('WebhookURL'))
-            user_timezone = pytz.timezone(NotifSettings('Notifier Settings').get('Timezone'))
+            notifier_settings = NotifSettings.snapshot('Notifier Settings')
+            try:
+                spool = Spool(digest=notifier_settings['DigestMissed'])
+            except sqlite3.Error as e:
+                print(f'[WARN] Could not open notification spool, undeliverable messages will be lost: {e}')
+                spool = None
+            config.webhook = Dispatcher(notifier_settings['WebhookURL'], spool=spool)
+            config.webhook.start()
+            user_timezone = pytz.timezone(notifier_settings['Timezone'])
         except:
             print("Discord Webhook URL or Timezone invalid, notifier disabled")
             return
@@ -44,34 +63,47 @@ class Notifier:
                         "stuck_in_cs",
                         "char_in_town",
                         "player_stuck",
-                        "especia_portal"
+                        "especia_portal",
+                        "routine_slow"
                         ]
 
         while True:
-            #try except to prevent crashing when user is editing while trying to load configs
-            #get user settings
-            try:
-                suppressAll = NotificationSetting('Notification Settings').get("Suppress_All")
-                alertForBotRunning = NotificationSetting('Notification Settings').get("bot_running_toggle")
-                for i in flaglist:
-                    self.watchlist[i] = {"toggle":NotificationSetting('Notification Settings').get(i+"_toggle"),
-                                            "msg":NotificationSetting('Notification Settings').get(i+"_notice")
-                                            }
-                reviveWhenDead = AutomationParams('Automation Settings').get("revive_when_dead_toggle")
-                pauseInTown = AutomationParams('Automation Settings').get("auto_pause_in_town_toggle")
-            except:
-                pass
+            #get user settings, cached snapshots are only reloaded when the files change
+            notification_settings = NotificationSetting.snapshot('Notification Settings')
+            automation_settings = AutomationParams.snapshot('Automation Settings')
+            suppressAll = notification_settings["Suppress_All"]
+            alertForBotRunning = notification_settings["bot_running_toggle"]
+            digestMode = notification_settings["digest_toggle"]
+            digestInterval = notification_settings["digest_interval"] * 60
+            for i in flaglist:
+                self.watchlist[i] = {"toggle":notification_settings[i+"_toggle"],
+                                        "msg":notification_settings[i+"_notice"]
+                                        }
+            reviveWhenDead = automation_settings["revive_when_dead_toggle"]
+            pauseInTown = automation_settings["auto_pause_in_town_toggle"]
             
             if config.enabled and suppressAll != True:
-                if alertForBotRunning:
-                    alertTextForRunning = NotificationSetting('Notification Settings').get("bot_running_notice")
+                if digestMode:
+                    #one aggregated message per interval replaces the repeated running notice
+                    if time.time() - self.lastDigestTime >= digestInterval:
+                        self.lastDigestTime = time.time()
+                        digest = stats.format_digest(stats.collect())
+                        if config.layout is not None:
+                            digest += "\n" + config.layout.path_cache_report()
+                        if config.bot is not None:
+                            digest += "\n" + config.bot.prefetcher.report()
+                        if config.routine is not None and config.routine.cycles is not None:
+                            digest += "\n" + config.routine.cycles.report()
+                        config.webhook.send(content=digest)
+                elif alertForBotRunning:
+                    alertTextForRunning = notification_settings["bot_running_notice"]
                     self.alert(config.webhook, user_timezone, self.lastAlertTimeDict, alertTextForRunning, alertCD=300)
                 for item in self.watchlist:
                     if getattr(config,item) == True:
                         if self.watchlist[item]["toggle"] == True:
                             alertSent = self.alert(config.webhook, user_timezone, self.lastAlertTimeDict, self.watchlist[item]["msg"])
-                            if item == "chatbox_msg" and alertSent:
-                                    self.alertFile(target=config.webhook, image="assets/chat.png")
+                            if item in SCREENSHOT_ROIS and alertSent:
+                                self.alertScreenshot(target=config.webhook, item=item)
                             if item == "character_dead" and reviveWhenDead:
                                 automation.autoRevive()
                             if item == "char_in_town" and pauseInTown:
@@ -89,7 +121,7 @@ class Notifier:
             if  lastAlertSeconds > alertCD:   
                 alertDict[alertText] = datetime.now()
                 alertTextandTime = alertText + " at " + (timezone.localize(datetime.now())).strftime('%d/%m/%Y %H:%M:%S')
-                target.send(content=alertTextandTime)
+                target.send(content=alertTextandTime, key=alertText)
                 return True
             else:
                 #print("[ALERT  ] Alert CD {:.2f}s: ".format(alertCD - lastAlertSeconds) +alertText)
@@ -97,10 +129,18 @@ class Notifier:
         else: 
             alertDict[alertText] = datetime.now()
             alertTextandTime = alertText + " at " + (timezone.localize(datetime.now())).strftime("%d/%m/%Y %H:%M:%S")
-            target.send(content=alertTextandTime)
+            target.send(content=alertTextandTime, key=alertText)
             print("[ALERT  ] Alert sent: "+ alertText)
             return True
 
-    def alertFile(self, target, image):
-        path = ".\\" + image
-        target.send(file=File(path))
\ No newline at end of file
+    def alertScreenshot(self, target, item):
+        """Sends the relevant part of the current frame, encoded in memory, as an attachment."""
+        frame = config.capture.frame if config.capture else None
+        if frame is None:
+            return
+        settings = NotifSettings.snapshot('Notifier Settings')
+        fmt = 'webp' if settings['ImageFormat'] == 'webp' else 'jpg'
+        data = utils.encode_image(frame, roi=SCREENSHOT_ROIS[item], max_width=MAX_SCREENSHOT_WIDTH,
+                                  fmt=fmt, quality=settings['ImageQuality'])
+        if data is not None:
+            target.send(file=(f"{item}.{fmt}", data))
\ No newline at end of file
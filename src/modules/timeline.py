@@ -0,0 +1,292 @@
+"""
+A persistent, append-only timeline of watcher flag transitions, rune solve attempts and
+routine cycles. Events are queued in memory by the threads that produce them and written
+to an SQLite database in batches by a background thread, so recording never blocks the
+bot. Can also be run as a script to query time-window aggregates from a finished run:
+
+    python -m src.modules.timeline summary --hours 12
+    python -m src.modules.timeline rate character_dead
+    python -m src.modules.timeline durations rune_cd
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+from src.common import config
+
+
+TIMELINE_DIR = '.timeline'
+TIMELINE_FILE = 'timeline.db'
+
+# Event kinds
+FLAG = 'flag'           # A watcher flag changed, VALUE is 1 if it was raised and 0 if it was cleared
+RUNE = 'rune'           # A rune solve was attempted, VALUE is 1 if it succeeded and 0 otherwise
+CYCLE = 'cycle'         # A full pass through a routine finished, VALUE is its duration in seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    t       REAL NOT NULL,
+    kind    TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    value   REAL
+);
+CREATE INDEX IF NOT EXISTS events_by_name ON events (kind, name, t);
+"""
+
+
+def get_timeline_path():
+    return os.path.join(TIMELINE_DIR, TIMELINE_FILE)
+
+
+def connect(path):
+    """
+    Opens the timeline database at PATH in WAL mode so that readers never block the writer.
+    :param path:    The path to the database file.
+    :return:        An sqlite3 Connection.
+    """
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record(kind, name, value=None):
+    """Records an event on the shared Timeline if one is running, otherwise does nothing."""
+
+    if config.timeline is not None:
+        config.timeline.record(kind, name, value)
+
+
+class Timeline:
+    """Batches events in memory and periodically appends them to the timeline database."""
+
+    FLUSH_INTERVAL = 2          # Seconds between batched writes
+    MAX_PENDING = 100_000       # Oldest events are dropped if the writer cannot keep up
+
+    def __init__(self, path=None):
+        """Initializes this Timeline object's writer thread."""
+
+        config.timeline = self
+        self.path = path or get_timeline_path()
+        self.pending = deque(maxlen=Timeline.MAX_PENDING)
+        self.ready = False
+        self.thread = threading.Thread(target=self._main)
+        self.thread.daemon = True
+
+    def start(self):
+        """Starts this Timeline's writer thread."""
+
+        print('\n[~] Started timeline')
+        self.thread.start()
+
+    def record(self, kind, name, value=None):
+        """
+        Queues an event to be written on the next flush. Safe to call from any thread.
+        :param kind:    One of FLAG, RUNE or CYCLE.
+        :param name:    The name of the flag, routine, etc. that the event belongs to.
+        :param value:   An optional number associated with the event.
+        :return:        None
+        """
+
+        self.pending.append((time.time(), kind, name, None if value is None else float(value)))
+
+    def _main(self):
+        try:
+            conn = connect(self.path)
+        except sqlite3.Error as e:
+            print(f'[WARN] Could not open timeline at {self.path}, events will not be saved: {e}')
+            self.ready = True
+            return
+        self.ready = True
+        while True:
+            time.sleep(Timeline.FLUSH_INTERVAL)
+            self._flush(conn)
+
+    def _flush(self, conn):
+        """Writes all queued events to CONN in a single transaction."""
+
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if batch:
+            try:
+                with conn:
+                    conn.executemany('INSERT INTO events VALUES (?, ?, ?, ?)', batch)
+            except sqlite3.Error as e:
+                print(f'[WARN] Failed to write {len(batch)} timeline events: {e}')
+
+
+#################################
+#           Queries             #
+#################################
+class TimelineReader:
+    """A read-only query API over a timeline database."""
+
+    def __init__(self, path=None):
+        self.conn = connect(path or get_timeline_path())
+
+    def events(self, kind=None, name=None, since=None, until=None):
+        """
+        Returns all events matching the given filters as (t, kind, name, value) tuples,
+        ordered by time. Filters that are None are ignored.
+        """
+
+        clauses, params = [], []
+        for column, value in (('kind', kind), ('name', name)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('t >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('t < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self.conn.execute(f'SELECT t, kind, name, value FROM events {where} ORDER BY t',
+                                 params).fetchall()
+
+    def names(self, kind):
+        """Returns the distinct names that have at least one event of the given KIND."""
+
+        rows = self.conn.execute('SELECT DISTINCT name FROM events WHERE kind = ? ORDER BY name',
+                                 (kind,))
+        return [r[0] for r in rows]
+
+    def counts(self, kind, name, bucket=3600, since=None, until=None):
+        """
+        Counts events in consecutive time buckets. For flags, only raises are counted.
+        :param bucket:  The width of each bucket in seconds.
+        :return:        A list of (bucket start time, count) tuples for non-empty buckets.
+        """
+
+        value = 'AND value = 1' if kind == FLAG else ''
+        rows = self.conn.execute(
+            f'SELECT CAST(t / ? AS INTEGER) * ? AS b, COUNT(*) FROM events '
+            f'WHERE kind = ? AND name = ? AND t >= ? AND t < ? {value} '
+            f'GROUP BY b ORDER BY b',
+            (bucket, bucket, kind, name,
+             -1 if since is None else since,
+             float('inf') if until is None else until)
+        )
+        return rows.fetchall()
+
+    def rate_per_hour(self, kind, name, since=None, until=None):
+        """Returns the average number of events per hour over the given window."""
+
+        events = self.events(kind, name, since, until)
+        if kind == FLAG:
+            events = [e for e in events if e[3] == 1]
+        if not events:
+            return 0.0
+        start = since if since is not None else events[0][0]
+        end = until if until is not None else max(events[-1][0], time.time())
+        hours = max(end - start, 1) / 3600
+        return len(events) / hours
+
+    def durations(self, name, since=None, until=None):
+        """
+        Returns the spans during which the flag NAME was raised.
+        :return:    A list of (start time, duration in seconds) tuples. A span that is still
+                    open at the end of the window is not included.
+        """
+
+        spans = []
+        raised = None
+        for t, _, _, value in self.events(FLAG, name, since, until):
+            if value == 1 and raised is None:
+                raised = t
+            elif value == 0 and raised is not None:
+                spans.append((raised, t - raised))
+                raised = None
+        return spans
+
+    def mean_duration(self, name, since=None, until=None):
+        """Returns the mean number of seconds that the flag NAME stays raised, or None."""
+
+        spans = self.durations(name, since, until)
+        if spans:
+            return sum(d for _, d in spans) / len(spans)
+
+    def summary(self, since=None, until=None):
+        """Returns a dictionary of aggregate statistics over the given window."""
+
+        flags = {}
+        for name in self.names(FLAG):
+            spans = self.durations(name, since, until)
+            flags[name] = {
+                'raised': sum(1 for e in self.events(FLAG, name, since, until) if e[3] == 1),
+                'per_hour': self.rate_per_hour(FLAG, name, since, until),
+                'mean_duration': sum(d for _, d in spans) / len(spans) if spans else None
+            }
+
+        runes = [e[3] for e in self.events(RUNE, None, since, until)]
+        cycles = [e[3] for e in self.events(CYCLE, None, since, until) if e[3] is not None]
+        return {
+            'flags': flags,
+            'runes_solved': sum(1 for r in runes if r == 1),
+            'runes_failed': sum(1 for r in runes if r == 0),
+            'cycles': len(cycles),
+            'mean_cycle': sum(cycles) / len(cycles) if cycles else None
+        }
+
+
+#################################
+#              CLI              #
+#################################
+def _format_time(t):
+    return datetime.fromtimestamp(t).strftime('%d/%m/%Y %H:%M:%S')
+
+
+def _format_seconds(s):
+    return '-' if s is None else f'{s:.1f}s'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Queries the Auto Maple event timeline.')
+    parser.add_argument('--db', default=get_timeline_path(), help='path to the timeline database')
+    parser.add_argument('--hours', type=float, help='only include the last HOURS hours')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('summary', help='aggregate statistics for every flag, runes and cycles')
+    rate = sub.add_parser('rate', help='how often a flag was raised, per time bucket')
+    rate.add_argument('name')
+    rate.add_argument('--bucket', type=float, default=3600, help='bucket width in seconds')
+    durations = sub.add_parser('durations', help='how long a flag stayed raised each time')
+    durations.add_argument('name')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.db):
+        print(f"[!] No timeline found at '{args.db}'")
+        return
+    reader = TimelineReader(args.db)
+    since = time.time() - args.hours * 3600 if args.hours else None
+
+    if args.command == 'summary':
+        result = reader.summary(since)
+        print(f"{'flag':<22}{'raised':>8}{'per hour':>10}{'mean duration':>16}")
+        for name, stats in result['flags'].items():
+            print(f"{name:<22}{stats['raised']:>8}{stats['per_hour']:>10.2f}"
+                  f"{_format_seconds(stats['mean_duration']):>16}")
+        print(f"\nRunes solved: {result['runes_solved']}, failed: {result['runes_failed']}")
+        print(f"Routine cycles: {result['cycles']}, mean duration: {_format_seconds(result['mean_cycle'])}")
+    elif args.command == 'rate':
+        for start, count in reader.counts(FLAG, args.name, args.bucket, since):
+            print(f'{_format_time(start)}  {count}')
+        print(f'Average: {reader.rate_per_hour(FLAG, args.name, since):.2f} per hour')
+    elif args.command == 'durations':
+        for start, duration in reader.durations(args.name, since):
+            print(f'{_format_time(start)}  {_format_seconds(duration)}')
+        print(f'Mean: {_format_seconds(reader.mean_duration(args.name, since))}')
+
+
+if __name__ == '__main__':
+    main()
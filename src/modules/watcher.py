@@ -6,10 +6,14 @@ to find specific patterns on screen and set corresponding config flags.
 import cv2
 import os
 import time
+import queue
+import atexit
 import threading
+import multiprocessing
 import numpy as np
-from datetime import datetime
-from src.common import config, utils
+from src.common import config, settings, utils, stats
+from src.common.shared_frame import SharedFrame
+from src.modules import timeline
 from resources import watcher_scan_table
 
 
@@ -37,6 +41,28 @@ RUNE_CD2_TEMPLATE = load_template_safe('assets/runeCD2.png')
 ELITE_TEMPLATE = load_template_safe('assets/elite_template.jpg')
 OTHER_TEMPLATE = load_template_safe('assets/other_template.png')
 
+# Every flag in config that is set by the Watcher
+WATCHER_FLAGS = (
+    'rune_cd',
+    'cursed_rune',
+    'no_damage_numbers',
+    'map_overcrowded',
+    'violetta_minigame',
+    'lie_detector_failed',
+    'game_disconnected',
+    'character_dead',
+    'chatbox_msg',
+    'stuck_in_cs',
+    'char_in_town',
+    'player_stuck',
+    'polo_portal',
+    'especia_portal',
+    'in_town'
+)
+
+# Flags that interrupt the routine element being executed as soon as they are raised
+PREEMPTING_FLAGS = ('character_dead', 'lie_detector_failed')
+
 
 #################################
 #      Utility Functions        #
@@ -46,8 +72,188 @@ def get_alert_path(name):
     return os.path.join(Watcher.ALERTS_DIR, f'{name}.mp3')
 
 
+class Scanner:
+    """
+    Runs the Watcher's full-frame template scans. Tracks how long each condition in the
+    dynamic scan table has held so that its flag is only raised after its threshold.
+    """
+
+    def __init__(self):
+        self.dynamic = watcher_scan_table.scan_table_dynamic
+        self.static = watcher_scan_table.scan_table_static
+        self.templates = {}
+        for table in (self.dynamic, self.static):
+            for entry, params in table.items():
+                self.templates[entry] = load_template_safe('assets/' + params.get('ImgName'))
+        self.first_detection = {entry: None for entry in self.dynamic}
+
+    def _matches(self, frame, entry, threshold=0.8):
+        template = self.templates[entry]
+        return template is not None and \
+            len(utils.multi_match(frame=frame, template=template, threshold=threshold)) > 0
+
+    def scan(self, frame):
+        """
+        Scans FRAME for every template in the scan tables.
+        :param frame:   The entire game window.
+        :return:        A dictionary mapping flag names to their new values. Flags whose
+                        condition has not yet held for long enough are omitted.
+        """
+
+        now = time.time()
+        runeCD1 = utils.multi_match(frame, RUNE_CD1_TEMPLATE, threshold=0.85)
+        runeCD2 = utils.multi_match(frame, RUNE_CD2_TEMPLATE, threshold=0.85)
+        flags = {'rune_cd': len(runeCD1) > 0 or len(runeCD2) > 0}
+
+        # Scan against dynamic scan table
+        for entry, params in self.dynamic.items():
+            if params.get('Invert') not in ('True', 'False'):
+                continue
+            present = self._matches(frame, entry)
+            if params.get('Invert') == 'True':
+                present = not present
+            if present:
+                if self.first_detection[entry] is None:
+                    self.first_detection[entry] = now
+                elif now - self.first_detection[entry] > int(params.get('Threshold')):
+                    flags[params.get('flag')] = True
+            else:
+                self.first_detection[entry] = None
+                flags[params.get('flag')] = False
+
+        # Check for static conditions
+        for entry, params in self.static.items():
+            flags[params.get('flag')] = self._matches(frame, entry)
+        return flags
+
+
+def _scan_worker(frame_name, enabled, results, interval):
+    """
+    The body of the Watcher's worker process. Scans the frames that Capture writes to the
+    SharedFrame called FRAME_NAME and sends every flag change back through RESULTS.
+    """
+
+    shared = SharedFrame(frame_name)
+    scanner = Scanner()
+    parent = multiprocessing.parent_process()
+    seq = -1
+    sent = {}
+    try:
+        while parent is None or parent.is_alive():
+            if enabled.value:
+                seq, frame = shared.read(seq)
+                if frame is not None:
+                    changes = {k: v for k, v in scanner.scan(frame).items() if sent.get(k) != v}
+                    if changes:
+                        sent.update(changes)
+                        results.put(changes)
+            time.sleep(interval)
+    finally:
+        shared.close()
+
+
+class ScanWorker:
+    """
+    Runs a Scanner in a separate process so that template matching does not compete with
+    the bot's threads for the GIL. Frames are shared through a SharedFrame written by
+    Capture, and flag changes come back through a queue. The process is restarted if it dies.
+    """
+
+    INTERVAL = 0.1          # Seconds between scans in the worker
+    RESTART_DELAY = 1       # Minimum number of seconds between restarts
+    RELEASE_TIMEOUT = 1     # Longest time to wait for Capture to stop writing a shared frame
+
+    def __init__(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.enabled = self.context.Value('b', False, lock=False)
+        self.results = self.context.Queue()
+        self.shared = None
+        self.process = None
+        self.last_start = 0
+        atexit.register(self.stop)
+
+    def supervise(self, frame, enabled):
+        """
+        Makes sure the worker process is running and scanning frames of the same size as
+        FRAME, but only while ENABLED is True.
+        """
+
+        self.enabled.value = enabled
+        if self.shared is not None and frame.nbytes > self.shared.capacity:
+            # Capture cannot fit larger frames into the old block, so the worker would keep scanning a stale one
+            print('[~] Game window grew, restarting the watcher process with a larger shared frame')
+            self._stop_process()
+            self._release()
+        if self.shared is None:
+            self.shared = SharedFrame(capacity=frame.nbytes)
+        if config.capture.shared_frame is not self.shared:
+            config.capture.shared_frame = self.shared
+        if self.process is None or not self.process.is_alive():
+            now = time.time()
+            if now - self.last_start > ScanWorker.RESTART_DELAY:
+                if self.process is not None:
+                    print(f'[WARN] Watcher process exited with code {self.process.exitcode}, restarting')
+                self.process = self.context.Process(
+                    target=_scan_worker,
+                    args=(self.shared.name, self.enabled, self.results, ScanWorker.INTERVAL),
+                    daemon=True
+                )
+                self.process.start()
+                self.last_start = now
+
+    def stop(self):
+        """
+        Stops the worker process and frees the shared frame, which is created again if
+        the worker is restarted. Also runs when the bot exits, so the block does not leak.
+        """
+
+        self.enabled.value = False
+        self._stop_process()
+        self._release()
+
+    def _stop_process(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(ScanWorker.RESTART_DELAY)
+        self.process = None
+        self.last_start = 0
+
+    def _release(self):
+        """
+        Detaches Capture from the shared frame and destroys it once Capture has processed
+        a later frame, which means it is no longer writing to the block.
+        """
+
+        if self.shared is None:
+            return
+        capture = config.capture
+        if capture is not None and capture.shared_frame is self.shared:
+            capture.shared_frame = None
+            capture.wait_for_frame(time.time(), ScanWorker.RELEASE_TIMEOUT)
+        try:
+            self.shared.close()
+        except BufferError:
+            print('[WARN] Could not free the shared frame while Capture was still writing to it')
+        self.shared = None
+
+    def scan(self, _):
+        """Returns every flag change that the worker process has reported since the last call."""
+
+        changes = {}
+        while True:
+            try:
+                changes.update(self.results.get_nowait())
+            except queue.Empty:
+                return changes
+
+
 class Watcher:
     ALERTS_DIR = os.path.join('assets', 'alerts')
+
+    # The player is stuck if they have not moved at all for STILL_WINDOW seconds, or have
+    # only been moving back and forth in a small area for OSCILLATION_WINDOW seconds
+    STILL_WINDOW = 20
+    OSCILLATION_WINDOW = 8
     
     def __init__(self):
         """Loads alert music and initializes this Watcher object's main thread."""
@@ -62,15 +268,25 @@ class Watcher:
 
     def _main(self):
         self.ready = True
-        rune_start_time = time.time()
-        std = watcher_scan_table.scan_table_dynamic
-        detectionTable = {}
-        for scanEntry in std:
-            detectionTable[scanEntry] = ""
-        sts = watcher_scan_table.scan_table_static
-        charLocation_Last = None
+        flags = {name: getattr(config, name) for name in WATCHER_FLAGS}
+        rune_was_ready = False
+        use_process = settings.watcher_process
+        worker = ScanWorker() if use_process else None
+        scanner = worker if use_process else Scanner()
 
         while True:
+            # Routines can move scanning into or out of a worker process
+            if settings.watcher_process != use_process:
+                use_process = settings.watcher_process
+                if use_process:
+                    if worker is None:
+                        worker = ScanWorker()
+                    scanner = worker
+                else:
+                    worker.stop()
+                    scanner = Scanner()
+                print(f"[~] Watcher now scans in {'a separate process' if use_process else 'a thread'}")
+
             # Wait for capture to be ready
             if not config.capture or not config.capture.ready:
                 time.sleep(0.1)
@@ -80,25 +296,22 @@ class Watcher:
             if frame is None:
                 time.sleep(0.1)
                 continue
-                
-            height, width, _ = frame.shape
-            minimap = config.capture.minimap_sample
+
+            if use_process:
+                scanner.supervise(frame, config.enabled)
 
             #scans in this section only activate if bot is enabled
             if config.enabled:
-                # Check for rune CD (keep this - needed for bot logic)
-                runeCD1 = utils.multi_match(frame, RUNE_CD1_TEMPLATE, threshold=0.85)
-                runeCD2 = utils.multi_match(frame, RUNE_CD2_TEMPLATE, threshold=0.85)
-                if len(runeCD1) > 0 or len(runeCD2) > 0:
-                    config.rune_cd = True
-                else:
-                    config.rune_cd = False
+                # Full-frame template scans, including rune CD (needed for bot logic)
+                for flagname, value in scanner.scan(frame).items():
+                    setattr(config, flagname, value)
 
                 # Update key stats into monitoring console
+                console = config.gui.view.monitoringconsole
                 if config.rune_cd:
-                    config.gui.view.monitoringconsole.set_runecdstat("Cooling down...")
+                    config.gui.post('rune_cd_stat', console.set_runecdstat, "Cooling down...")
                 elif not config.rune_cd:
-                    config.gui.view.monitoringconsole.set_runecdstat("Ready to Solve")
+                    config.gui.post('rune_cd_stat', console.set_runecdstat, "Ready to Solve")
 
                 # Check for number of other players in map
                 others_count = len(config.others_pos) if hasattr(config, 'others_pos') else 0
@@ -106,63 +319,46 @@ class Watcher:
                     config.map_overcrowded = True
                 else:
                     config.map_overcrowded = False
-                config.gui.view.monitoringconsole.set_noOthers(str(others_count))
-
-                # Scan against dynamic scan table
-                for scanEntry in std:
-                    params = std[scanEntry]
-                    flagname = params.get("flag")
-                    target = cv2.imread("assets/"+params.get("ImgName"),0)
-                    matchCount = utils.multi_match(frame=frame, template=target, threshold=0.8)                   
-                    if params.get("Invert") == "False":
-                        if matchCount != []:
-                            if detectionTable[scanEntry] == "":
-                                detectionTable[scanEntry] = datetime.now()
-                            else:
-                                firstDetection = detectionTable[scanEntry]
-                                if (datetime.now() - firstDetection).total_seconds() > int(params.get("Threshold")):
-                                    setattr(config,flagname,True)
-
-                        else:
-                            detectionTable[scanEntry] = ""
-                            setattr(config,flagname,False)
-                    if params.get("Invert") == "True":
-                        if matchCount == []:
-                            if detectionTable[scanEntry] == "":
-                                detectionTable[scanEntry] = datetime.now()
-                            else:
-                                firstDetection = detectionTable[scanEntry]
-                                if (datetime.now() - firstDetection).total_seconds() > int(params.get("Threshold")):
-                                    setattr(config,flagname,True)
-                        else:
-                            detectionTable[scanEntry] = ""
-                            setattr(config,flagname,False)
-
-                # Check for static conditions
-                for scanEntry in sts:
-                    params = sts[scanEntry]
-                    flagname = params.get("flag")
-                    target = cv2.imread("assets/"+params.get("ImgName"),0)
-                    matchCount = utils.multi_match(frame=frame, template=target, threshold=0.8)
-                    if matchCount != []:
-                        setattr(config,flagname,True)
-                    else:
-                        setattr(config,flagname,False)
+                config.gui.post('others_stat', console.set_noOthers, str(others_count))
+
+                # Interrupt the current routine element as soon as a rune can be solved
+                rune_ready = not config.rune_cd and bool(config.capture.minimap.get('rune_active'))
+                if rune_ready and not rune_was_ready:
+                    utils.request_preemption('rune')
+                rune_was_ready = rune_ready
 
                 # Custom checks
-                charLocation_Current = config.player_pos
-                if charLocation_Last == charLocation_Current:
-                    config.player_stuck = True
-                else:
-                    config.player_stuck = False
-                charLocation_Last = charLocation_Current
+                motion = config.capture.motion
+                config.player_stuck = \
+                    motion.is_stationary(Watcher.STILL_WINDOW, settings.adjust_tolerance) or \
+                    motion.is_oscillating(Watcher.OSCILLATION_WINDOW, settings.move_tolerance)
+
+            self._check_transitions(flags)
 
             # Update GUI flags regardless of bot enabled state
-            if hasattr(config, 'gui') and config.gui and hasattr(config.gui, 'runtime'):
-                config.gui.runtime.runtimeFlags.update_All_Flags()
+            if config.gui is not None:
+                config.gui.post('runtime_flags', config.gui.runtime_console.runtimeFlags.update_All_Flags)
 
             time.sleep(0.1)
 
+    @staticmethod
+    def _check_transitions(flags):
+        """
+        Records every watcher flag that changed since the last call onto the timeline
+        and into the run statistics, preempting the bot if a PREEMPTING_FLAG was raised.
+        :param flags:   A dictionary of each flag's previous value, updated in place.
+        :return:        None
+        """
+
+        for name, prev in flags.items():
+            curr = getattr(config, name)
+            if curr != prev:
+                flags[name] = curr
+                timeline.record(timeline.FLAG, name, int(bool(curr)))
+                stats.flag(name, bool(curr))
+                if curr and name in PREEMPTING_FLAGS:
+                    utils.request_preemption(name)
+
     def _alert(self, name, volume=0.75):
         """
         Plays an alert to notify user of a dangerous in-game event. Alerts are stored
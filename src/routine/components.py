@@ -2,7 +2,7 @@
 
 import math
 import time
-from src.common import config, settings, utils
+from src.common import config, settings, utils, profiler
 from src.common.arduino_input import key_down, key_up, press
 
 
@@ -29,7 +29,10 @@ class Component:
 
     @utils.run_if_enabled
     def execute(self):
-        self.main()
+        if settings.profile:
+            profiler.PROFILER.run(self)
+        else:
+            self.main()
 
     def main(self):
         pass
@@ -80,12 +83,17 @@ class Point(Component):
         if self.counter == 0:
             move = config.bot.command_book['move']
             move(*self.location).execute()
-            if self.adjust:
+            if self.adjust and not utils.preempted():
                 adjust = config.bot.command_book['adjust']      # TODO: adjust using step('up')?
                 adjust(*self.location).execute()
+            if not utils.preempted():
+                config.routine.record_arrival(self.location)
             for command in self.commands:
+                if utils.preempted():
+                    return          # Interrupted, this Point will run again from the start
                 command.execute()
-        self._increment_counter()
+        if not utils.preempted():
+            self._increment_counter()
 
     @utils.run_if_enabled
     def _increment_counter(self):
@@ -227,7 +235,15 @@ class Command(Component):
 
 
 class Move(Command):
-    """Moves to a given position using the shortest path based on the current Layout."""
+    """
+    Moves to a given position using the shortest path based on the current Layout. After
+    each step, waits for a frame that shows its effect and decides the next step from the
+    player's position extrapolated by their current velocity, so that it does not keep
+    stepping towards a point that the player is already sliding past.
+    """
+
+    FEEDBACK_TIMEOUT = 0.5      # Longest time to wait for a new frame after a step
+    VELOCITY_WINDOW = 0.3       # Seconds of motion history that velocity is estimated from
 
     def __init__(self, x, y, max_steps=15):
         super().__init__(locals())
@@ -241,47 +257,89 @@ class Move(Command):
             key_up(self.prev_direction)
         self.prev_direction = new
 
+    @staticmethod
+    def _feedback(stepped):
+        """
+        Waits until a frame captured after a step finished pressing its keys at time
+        STEPPED has been processed, and until the player has had at least one control
+        period since STEPPED to settle.
+        """
+
+        config.capture.wait_for_frame(stepped, Move.FEEDBACK_TIMEOUT)
+        remaining = stepped + 1 / max(settings.control_rate, 1) - time.time()
+        if remaining > 0:
+            utils.preemptible_sleep(remaining)
+
+    @staticmethod
+    def _position():
+        """Returns the player's position one control period from now at their current velocity."""
+
+        x, y = config.player_pos
+        v_x, v_y = config.capture.motion.velocity(Move.VELOCITY_WINDOW)
+        lead = 1 / max(settings.control_rate, 1)
+        return x + v_x * lead, y + v_y * lead
+
+    @staticmethod
+    def _record(direction, start, started):
+        """Adds the step in DIRECTION that began at START at time STARTED to the Layout's cost model."""
+
+        layout = config.layout
+        if layout is not None and not utils.preempted():
+            layout.costs.record(direction, start, config.player_pos, time.time() - started)
+
     def main(self):
         counter = self.max_steps
-        path = config.layout.shortest_path(config.player_pos, self.target)
-        for i, point in enumerate(path):
+        path = config.bot.prefetcher.take(config.player_pos, self.target)
+        if path is None:
+            path = config.layout.shortest_path(config.player_pos, self.target)
+        else:
+            config.path = path.copy()
+        for point in path:
+            if utils.preempted():
+                break
             toggle = True
             self.prev_direction = ''
-            local_error = utils.distance(config.player_pos, point)
-            global_error = utils.distance(config.player_pos, self.target)
-            while config.enabled and counter > 0 and \
+            position = Move._position()
+            local_error = utils.distance(position, point)
+            global_error = utils.distance(position, self.target)
+            while config.enabled and counter > 0 and not utils.preempted() and \
                     local_error > settings.move_tolerance and \
                     global_error > settings.move_tolerance:
                 if toggle:
-                    d_x = point[0] - config.player_pos[0]
+                    d_x = point[0] - position[0]
                     if abs(d_x) > settings.move_tolerance / math.sqrt(2):
                         if d_x < 0:
                             key = 'left'
                         else:
                             key = 'right'
+                        start, started = config.player_pos, time.time()
                         self._new_direction(key)
                         step(key, point)
+                        stepped = time.time()
                         if settings.record_layout:
                             config.layout.add(*config.player_pos)
                         counter -= 1
-                        if i < len(path) - 1:
-                            time.sleep(0.15)
+                        Move._feedback(stepped)
+                        self._record(key, start, started)
                 else:
-                    d_y = point[1] - config.player_pos[1]
+                    d_y = point[1] - position[1]
                     if abs(d_y) > settings.move_tolerance / math.sqrt(2):
                         if d_y < 0:
                             key = 'up'
                         else:
                             key = 'down'
+                        start, started = config.player_pos, time.time()
                         self._new_direction(key)
                         step(key, point)
+                        stepped = time.time()
                         if settings.record_layout:
                             config.layout.add(*config.player_pos)
                         counter -= 1
-                        if i < len(path) - 1:
-                            time.sleep(0.05)
-                local_error = utils.distance(config.player_pos, point)
-                global_error = utils.distance(config.player_pos, self.target)
+                        Move._feedback(stepped)
+                        self._record(key, start, started)
+                position = Move._position()
+                local_error = utils.distance(position, point)
+                global_error = utils.distance(position, self.target)
                 toggle = not toggle
             if self.prev_direction:
                 key_up(self.prev_direction)
@@ -316,7 +374,7 @@ class Wait(Command):
         self.duration = float(duration)
 
     def main(self):
-        time.sleep(self.duration)
+        utils.preemptible_sleep(self.duration)
 
 
 class Walk(Command):
@@ -329,7 +387,7 @@ class Walk(Command):
 
     def main(self):
         key_down(self.direction)
-        time.sleep(self.duration)
+        utils.preemptible_sleep(self.duration)
         key_up(self.direction)
         time.sleep(0.05)
 
@@ -353,6 +411,7 @@ class Fall(Command):
         counter = 6
         while config.enabled and \
                 counter > 0 and \
+                not utils.preempted() and \
                 utils.distance(start, config.player_pos) < self.distance:
             press('space', 1, down_time=0.1)
             counter -= 1
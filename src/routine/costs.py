@@ -0,0 +1,129 @@
+"""
+Learns how long movement steps take in-game, so that paths can be planned by travel time
+rather than by minimap distance. A vertical teleport, a rope climb and a horizontal dash
+can cover the same distance in very different amounts of time.
+"""
+
+import os
+import math
+import threading
+import numpy as np
+
+
+COSTS_EXTENSION = '.costs.npz'
+
+DIRECTIONS = ('left', 'right', 'up', 'down')
+TABLE_SIZE = 4096           # Number of most recent steps that are kept
+BUCKET_WIDTH = 0.025        # Width of each distance bucket, in minimap units
+NUM_BUCKETS = 8             # Steps longer than the last bucket fall into it
+MIN_SAMPLES = 5             # Samples a bucket needs before its mean is trusted
+MAX_WEIGHT = 200            # Caps how many samples a running mean averages over, so it can adapt
+
+
+class CostModel:
+    """
+    Records every executed movement step in a preallocated table and keeps running means of
+    their durations per direction and distance bucket, along with a per-direction linear
+    fit of duration against distance for distances that no bucket covers well.
+    """
+
+    def __init__(self):
+        self.table = np.zeros((TABLE_SIZE, 6), dtype=np.float32)     # direction, x0, y0, x1, y1, seconds
+        self.count = 0              # Total number of steps recorded
+        self.means = np.zeros((len(DIRECTIONS), NUM_BUCKETS))
+        self.samples = np.zeros((len(DIRECTIONS), NUM_BUCKETS), dtype=np.int64)
+        self.sums = np.zeros((len(DIRECTIONS), 5))     # n, sum d, sum t, sum d^2, sum d*t
+        self.min_rate = math.inf    # Fewest seconds per unit of distance seen in any step
+        self.dirty = False          # Whether there are steps that have not been saved yet
+        self.lock = threading.Lock()
+
+    def record(self, direction, start, end, elapsed):
+        """
+        Adds a single executed step to this CostModel.
+        :param direction:   The arrow key that was held, one of DIRECTIONS.
+        :param start:       The player's position before the step.
+        :param end:         The player's position after the step.
+        :param elapsed:     How many seconds the step took.
+        :return:            None
+        """
+
+        d = DIRECTIONS.index(direction)
+        distance = math.hypot(end[0] - start[0], end[1] - start[1])
+        b = min(int(distance / BUCKET_WIDTH), NUM_BUCKETS - 1)
+        with self.lock:
+            self.table[self.count % TABLE_SIZE] = (d, start[0], start[1], end[0], end[1], elapsed)
+            self.count += 1
+            self.samples[d, b] += 1
+            self.means[d, b] += (elapsed - self.means[d, b]) / min(self.samples[d, b], MAX_WEIGHT)
+            self.sums[d] += (1, distance, elapsed, distance * distance, distance * elapsed)
+            if distance >= BUCKET_WIDTH:
+                self.min_rate = min(self.min_rate, elapsed / distance)
+            self.dirty = True
+
+    def ready(self):
+        """Returns whether enough steps have been recorded to estimate costs."""
+
+        return self.count >= MIN_SAMPLES and self.min_rate < math.inf
+
+    def estimate(self, start, end):
+        """
+        Returns the expected number of seconds it takes to move from START to END, which
+        are assumed to be a single horizontal or vertical movement apart. Never returns
+        less than DISTANCE * min_rate, so A* can use that as an admissible heuristic.
+        """
+
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        if abs(dx) >= abs(dy):
+            d = 0 if dx < 0 else 1
+        else:
+            d = 2 if dy < 0 else 3
+        distance = math.hypot(dx, dy)
+        b = int(distance / BUCKET_WIDTH)
+        floor = distance * self.min_rate
+        if b < NUM_BUCKETS - 1 and self.samples[d, b] >= MIN_SAMPLES:
+            return max(self.means[d, b], floor)
+
+        # Fit duration = intercept + slope * distance from every step in this direction
+        n, s_d, s_t, s_dd, s_dt = self.sums[d]
+        variance = n * s_dd - s_d * s_d
+        if n >= MIN_SAMPLES and variance > 1e-12:
+            slope = (n * s_dt - s_d * s_t) / variance
+            intercept = (s_t - slope * s_d) / n
+            if slope > 0:
+                return max(intercept + slope * distance, floor)
+        return floor
+
+    def steps(self):
+        """Returns the recorded steps that are still in the table, oldest first."""
+
+        with self.lock:
+            n = min(self.count, TABLE_SIZE)
+            start = self.count % TABLE_SIZE if self.count > TABLE_SIZE else 0
+            return np.roll(self.table[:n], -start, axis=0)
+
+    def save(self, path):
+        """Atomically writes the recorded steps to PATH."""
+
+        steps = self.steps()
+        with open(path + '.tmp', 'wb') as file:
+            np.savez(file, steps=steps)
+        os.replace(path + '.tmp', path)
+        self.dirty = False
+
+    @staticmethod
+    def load(path):
+        """Returns a CostModel rebuilt from the steps saved at PATH, or a new one if there are none."""
+
+        model = CostModel()
+        if os.path.isfile(path):
+            try:
+                with np.load(path) as data:
+                    steps = data['steps']
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARN] Failed to read movement costs at '{path}': {e}")
+                return model
+            for d, x0, y0, x1, y1, elapsed in steps.tolist():
+                model.record(DIRECTIONS[int(d)], (x0, y0), (x1, y1), elapsed)
+            model.dirty = False
+        return model
@@ -0,0 +1,146 @@
+"""
+Measures how long each full pass through a routine takes, along with when each Point is
+reached within a pass, and keeps running statistics per routine file across sessions.
+A routine whose cycles suddenly take much longer than usual is often a sign of failing
+detection or a Layout that no longer matches the map, so a sustained slowdown raises the
+'routine_slow' flag for the Notifier.
+"""
+
+import os
+import json
+from collections import deque
+import numpy as np
+from src.common import config
+
+
+CYCLES_EXTENSION = '.cycles.json'
+FORMAT_VERSION = 1
+
+ALPHA = 0.1                 # Weight of the newest cycle in the running averages
+WINDOW = 100                # Number of most recent cycles kept for percentiles and the baseline
+MIN_CYCLES = 5              # Cycles needed before there is a baseline to compare against
+SLOW_FACTOR = 1.5           # Cycles taking this many times the baseline are considered slow
+SLOW_CYCLES = 3             # Consecutive slow cycles needed to raise the flag
+
+
+def get_cycles_path(routine_path):
+    """Returns the path to the statistics kept for the routine file at ROUTINE_PATH."""
+
+    return os.path.splitext(routine_path)[0] + CYCLES_EXTENSION
+
+
+class CycleStats:
+    """Running statistics on the cycles of a single routine file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.durations = deque(maxlen=WINDOW)   # Seconds taken by the most recent cycles
+        self.average = None                     # Exponentially weighted mean of every cycle
+        self.count = 0                          # Cycles ever recorded, across sessions
+        self.session = 0                        # Cycles recorded since the routine was loaded
+        self.arrivals = {}          # Maps each Point's location to its [average, count] arrival time
+        self.streak = 0             # Number of consecutive slow cycles
+
+    def baseline(self):
+        """Returns the median duration of the recent cycles, or None if there are too few."""
+
+        if len(self.durations) < MIN_CYCLES:
+            return None
+        return float(np.median(self.durations))
+
+    def p95(self):
+        if not self.durations:
+            return None
+        return float(np.percentile(self.durations, 95))
+
+    def record(self, duration):
+        """
+        Adds a finished cycle and raises or clears config.routine_slow depending on how
+        it compares to the baseline.
+        :param duration:    How many seconds the cycle took.
+        :return:            None
+        """
+
+        baseline = self.baseline()
+        self.durations.append(duration)
+        self.average = duration if self.average is None else \
+            self.average + ALPHA * (duration - self.average)
+        self.count += 1
+        self.session += 1
+
+        if baseline is not None and duration > SLOW_FACTOR * baseline:
+            self.streak += 1
+            if self.streak == SLOW_CYCLES:
+                print(f'\n[WARN] The last {SLOW_CYCLES} routine cycles took {duration / baseline:.1f}x '
+                      f'longer than usual ({duration:.1f}s, usually {baseline:.1f}s).')
+                config.routine_slow = True
+        else:
+            self.streak = 0
+            config.routine_slow = False
+
+        try:
+            self.save()
+        except OSError as e:
+            print(f"[WARN] Failed to save cycle statistics to '{self.path}': {e}")
+
+    def arrive(self, location, elapsed):
+        """
+        Records that the Point at LOCATION was reached ELAPSED seconds into the current cycle.
+        :param location:    The (x, y) location of the Point.
+        :param elapsed:     Seconds since the current cycle began.
+        :return:            None
+        """
+
+        key = f'{location[0]:.3f},{location[1]:.3f}'
+        entry = self.arrivals.get(key)
+        if entry is None:
+            self.arrivals[key] = [elapsed, 1]
+        else:
+            entry[0] += ALPHA * (elapsed - entry[0])
+            entry[1] += 1
+
+    def report(self):
+        """Returns a one-line summary of this routine's cycles, suitable for the run digest."""
+
+        if self.average is None:
+            return 'Cycle times: no cycles recorded yet'
+        baseline = self.baseline()
+        result = f'Cycle times: {self.session} this session, average {self.average:.1f}s, ' \
+                 f'p95 {self.p95():.1f}s'
+        if baseline is not None:
+            result += f', baseline {baseline:.1f}s'
+        return result
+
+    def save(self):
+        """Atomically writes these statistics next to the routine file."""
+
+        data = {
+            'version': FORMAT_VERSION,
+            'count': self.count,
+            'average': self.average,
+            'durations': list(self.durations),
+            'arrivals': self.arrivals
+        }
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(self.path + '.tmp', self.path)
+
+    @staticmethod
+    def load(routine_path):
+        """Returns the statistics saved for the routine file at ROUTINE_PATH, or new ones if there are none."""
+
+        path = get_cycles_path(routine_path)
+        stats = CycleStats(path)
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as file:
+                    data = json.load(file)
+                if data['version'] <= FORMAT_VERSION:
+                    stats.durations.extend(float(d) for d in data['durations'])
+                    stats.average = data['average']
+                    stats.count = int(data['count'])
+                    stats.arrivals = {key: [float(a), int(n)] for key, (a, n) in data['arrivals'].items()}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[WARN] Failed to read cycle statistics at '{path}': {e}")
+                return CycleStats(path)
+        return stats
@@ -0,0 +1,95 @@
+"""A static two-dimensional KD-tree for nearest neighbor queries over minimap positions."""
+
+import heapq
+import math
+
+
+class KDNode:
+    """A single location in a KDTree, splitting space along one axis."""
+
+    __slots__ = ('location', 'value', 'axis', 'left', 'right')
+
+    def __init__(self, location, value, axis):
+        self.location = location
+        self.value = value
+        self.axis = axis
+        self.left = None
+        self.right = None
+
+
+class KDTree:
+    """
+    An immutable KD-tree that is built once in O(n log n) and answers nearest and k-nearest
+    queries in O(log n) on average. Build a new tree whenever the underlying locations change.
+    """
+
+    def __init__(self, items):
+        """
+        Builds a balanced KDTree.
+        :param items:   An iterable of ((x, y), value) pairs, VALUE being returned by queries.
+        """
+
+        items = [(tuple(location), value) for location, value in items]
+        self.size = len(items)
+        self.root = KDTree._build(items, 0)
+
+    @staticmethod
+    def _build(items, depth):
+        if not items:
+            return None
+        axis = depth % 2
+        items.sort(key=lambda item: item[0][axis])
+        median = len(items) // 2
+        location, value = items[median]
+        node = KDNode(location, value, axis)
+        node.left = KDTree._build(items[:median], depth + 1)
+        node.right = KDTree._build(items[median+1:], depth + 1)
+        return node
+
+    def nearest(self, target):
+        """
+        Returns the item closest to TARGET.
+        :param target:  The (x, y) position to search around.
+        :return:        The closest (location, value, distance) tuple, or None if this tree is empty.
+        """
+
+        result = self.k_nearest(target, 1)
+        return result[0] if result else None
+
+    def k_nearest(self, target, k):
+        """
+        Returns up to K items closest to TARGET, nearest first.
+        :param target:  The (x, y) position to search around.
+        :param k:       The maximum number of items to return.
+        :return:        A list of (location, value, distance) tuples.
+        """
+
+        if k <= 0 or self.root is None:
+            return []
+        best = []           # Max-heap of (-squared distance, tiebreaker, node) of size at most K
+        counter = 0
+        stack = [(self.root, 0)]     # Nodes to visit and a lower bound on their squared distance
+        while stack:
+            node, bound = stack.pop()
+            if node is None or (len(best) == k and bound >= -best[0][0]):
+                continue
+            dx = target[0] - node.location[0]
+            dy = target[1] - node.location[1]
+            d2 = dx * dx + dy * dy
+            if len(best) < k:
+                heapq.heappush(best, (-d2, counter, node))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, counter, node))
+            counter += 1
+
+            # Visit the side containing TARGET first, the other can only hold items beyond the split
+            diff = target[node.axis] - node.location[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return [(node.location, node.value, math.sqrt(-d2)) for d2, _, node in best]
+
+    def __len__(self):
+        return self.size
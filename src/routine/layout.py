@@ -1,16 +1,48 @@
 """A module for saving map layouts and determining shortest paths."""
 
 import os
-import cv2
+import argparse
 import math
+import time
 import pickle
+import struct
+import threading
+import numpy as np
+from collections import OrderedDict
 from src.common import config, settings, utils
+from src.routine.mapgraph import MapGraph, MAP_EXTENSION, PLATFORM, ROPE
+from src.routine.costs import CostModel, COSTS_EXTENSION
 from os.path import join, isfile, splitext, basename
 from heapq import heappush, heappop
 
 
+# Layout snapshots are stored in the following binary format, all values little-endian:
+#   8s      Magic bytes SNAPSHOT_MAGIC
+#   H       Format version
+#   H       Length of the Layout's UTF-8 name in bytes
+#   I       Number of points N
+#   I       Number of navigation graph edges E
+#   d       move_tolerance the graph was built with, or 0 if no graph is stored
+#   ...     The name, zero-padded to a multiple of 4 bytes
+#   f4[N]   x positions, followed by f4[N] y positions
+#   u4[N+1] Only if a graph is stored: offsets into the edge targets for each point, so the
+#           neighbors of point i are targets[offsets[i]:offsets[i+1]], followed by u4[E] targets
+SNAPSHOT_MAGIC = b'AMLAYOUT'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sHHIId')
+SNAPSHOT_EXTENSION = '.layout'
+LEGACY_EXTENSION = '.pickle'        # Appended to legacy pickled Layouts once they are migrated
+
+# Points added since the last snapshot are appended to a log next to it, one record per point
+POINT_LOG_EXTENSION = '.points'
+POINT_RECORD = struct.Struct('<ff')         # x, y as little-endian float32
+
+
 class Node:
-    """Represents a vertex on a quadtree."""
+    """
+    Represents a vertex on a quadtree. Layouts no longer use quadtrees, but this class is
+    needed to unpickle Layouts saved before they were stored as arrays.
+    """
 
     def __init__(self, x, y):
         """
@@ -62,9 +94,20 @@ class Node:
 
 
 class Layout:
-    """Uses a quadtree to represent possible player positions in a map layout."""
+    """
+    Stores possible player positions in a map layout as parallel float32 arrays, indexed by
+    a uniform grid of CELL_SIZE cells so that range queries only examine nearby points.
+    Also maintains a navigation graph connecting every pair of points that are a single
+    horizontal or vertical teleport apart, which paths are planned over.
+    """
 
     TOLERANCE = settings.move_tolerance / 2
+    CELL_SIZE = settings.move_tolerance
+    HOP_PENALTY = 0.5           # Extra cost of each teleport, as a fraction of move_tolerance
+    PATH_CACHE_SIZE = 256       # Least recently used paths are evicted beyond this
+    COMPACT_THRESHOLD = 4096    # Logged points that trigger writing a new snapshot
+    RECOMPACT_GROWTH = 1024     # Points recorded since the last compaction that trigger another
+    INITIAL_CAPACITY = 256
 
     def __init__(self, name):
         """
@@ -73,222 +116,642 @@ class Layout:
         """
 
         self.name = name
-        self.root = None
+        self._init_points(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+
+    def _init_points(self, xs, ys):
+        """Replaces this Layout's points with the arrays XS and YS and rebuilds the grid."""
+
+        n = len(xs)
+        capacity = max(Layout.INITIAL_CAPACITY, 1 << max(0, n - 1).bit_length())
+        self._xs = np.zeros(capacity, dtype=np.float32)
+        self._ys = np.zeros(capacity, dtype=np.float32)
+        self._xs[:n] = xs
+        self._ys[:n] = ys
+        self.size = n
+        self.grid = {}          # Maps each (column, row) cell to the indices of its points
+        self.edges = None       # Maps each point's index to the points one teleport away
+        self.edges_tolerance = None
+        self.path_cache = OrderedDict()     # Maps (source cell, target) to (path, bounds, planning time)
+        self.path_cache_tolerance = None
+        self.path_cache_lock = threading.Lock()
+        self.path_cache_stats = {'hits': 0, 'misses': 0, 'saved': 0.0}
+        self.persisted = 0      # Number of points already in the snapshot or point log
+        self.logged = 0         # Number of points in the point log
+        self.version = 0        # Incremented whenever a point is added
+        self.lock = threading.Lock()        # Serializes adding points with replacing this Layout
+        self.replacement = None     # The compacted Layout that took this one's place, if any
+        self.compacted_size = n     # Number of points after the last compaction
+        self.map_graph = None       # Platforms and ropes extracted from these points
+        self.costs = CostModel()    # How long movement steps have taken on this map
+        self.needs_snapshot = False
+        if n == 0:
+            return
+
+        # Group point indices by cell all at once, rather than inserting them one at a time
+        cols = np.floor(self._xs[:n] / Layout.CELL_SIZE).astype(np.int64)
+        rows = np.floor(self._ys[:n] / Layout.CELL_SIZE).astype(np.int64)
+        order = np.lexsort((rows, cols))
+        cols, rows = cols[order], rows[order]
+        bounds = np.flatnonzero((np.diff(cols) != 0) | (np.diff(rows) != 0)) + 1
+        starts = np.concatenate(([0], bounds)).tolist()
+        ends = np.concatenate((bounds, [n])).tolist()
+        order = order.tolist()
+        cols, rows = cols.tolist(), rows.tolist()
+        for start, end in zip(starts, ends):
+            self.grid[(cols[start], rows[start])] = order[start:end]
+
+    @staticmethod
+    def _cell(x, y):
+        return int(math.floor(x / Layout.CELL_SIZE)), int(math.floor(y / Layout.CELL_SIZE))
 
     @utils.run_if_enabled
     def add(self, x, y):
         """
-        Adds a Node to the quadtree at position (X, Y) if it does not already exist.
+        Adds a point at position (X, Y) if there is no other point within TOLERANCE of it.
         :param x:   The x-position of the new point.
         :param y:   The y-position of the new point.
         :return:    None
         """
 
-        def add_helper(node):
-            if not node:
-                return Node(x, y)
-            if y >= node.y and x < node.x:
-                node.up_left = add_helper(node.up_left)
-            elif y >= node.y and x >= node.x:
-                node.up_right = add_helper(node.up_right)
-            elif y < node.y and x < node.x:
-                node.down_left = add_helper(node.down_left)
-            else:
-                node.down_right = add_helper(node.down_right)
-            return node
+        with self.lock:
+            replacement = self.replacement
+            if replacement is None:
+                checks = map(lambda p: utils.distance(p, (x, y)) >= Layout.TOLERANCE,
+                             self.search(x - Layout.TOLERANCE,
+                                         x + Layout.TOLERANCE,
+                                         y - Layout.TOLERANCE,
+                                         y + Layout.TOLERANCE))
+                if all(checks):
+                    self._append(x, y)
+                return
+        replacement.add(x, y)
+
+    def _append(self, x, y):
+        i = self.size
+        if i == len(self._xs):
+            # Fill new arrays before publishing them so that concurrent readers never see holes
+            xs = np.zeros(2 * len(self._xs), dtype=np.float32)
+            ys = np.zeros(2 * len(self._ys), dtype=np.float32)
+            xs[:i] = self._xs[:i]
+            ys[:i] = self._ys[:i]
+            self._xs, self._ys = xs, ys
+        self._xs[i] = x
+        self._ys[i] = y
+        self.grid.setdefault(Layout._cell(self._xs[i], self._ys[i]), []).append(i)
+        self.size = i + 1
+        self.version += 1
+
+        self._invalidate_paths(x, y)
+
+        # Connect the new point to the navigation graph
+        edges = self.edges
+        if edges is not None and self.edges_tolerance == settings.move_tolerance and len(edges) == i:
+            neighbors = [j for j in self._teleport_neighbors(x, y).tolist() if j != i]
+            for j in neighbors:
+                edges[j].append(i)
+            edges.append(neighbors)
+        else:
+            self.edges = None
+
+    def points(self):
+        """Returns an (N, 2) float32 array of every point in this Layout."""
 
-        def check_collision(point):
-            return utils.distance(tuple(point), (x, y)) >= Layout.TOLERANCE
+        n = self.size
+        return np.column_stack((self._xs[:n], self._ys[:n]))
 
-        checks = map(check_collision, self.search(x - Layout.TOLERANCE,
-                                                  x + Layout.TOLERANCE,
-                                                  y - Layout.TOLERANCE,
-                                                  y + Layout.TOLERANCE))
-        if all(checks):
-            self.root = add_helper(self.root)
+    def _search_indices(self, x_min, x_max, y_min, y_max):
+        """Returns an array of the indices of all points within the given range."""
+
+        n = self.size
+        xs, ys = self._xs[:n], self._ys[:n]
+        c_min = Layout._cell(x_min, y_min)
+        c_max = Layout._cell(x_max, y_max)
+        num_cells = (c_max[0] - c_min[0] + 1) * (c_max[1] - c_min[1] + 1)
+        if num_cells >= len(self.grid):
+            # Scanning every point is cheaper than visiting this many cells
+            candidates = np.arange(n)
+        else:
+            indices = []
+            for cx in range(c_min[0], c_max[0] + 1):
+                for cy in range(c_min[1], c_max[1] + 1):
+                    cell = self.grid.get((cx, cy))
+                    if cell:
+                        indices.extend(cell)
+            candidates = np.array(indices, dtype=np.int64)
+            candidates = candidates[candidates < n]
+        cx, cy = xs[candidates], ys[candidates]
+        mask = (cx >= x_min) & (cx <= x_max) & (cy >= y_min) & (cy <= y_max)
+        return candidates[mask]
 
     def search(self, x_min, x_max, y_min, y_max):
         """
-        Returns a list of all Nodes bounded horizontally by X_MIN and X_MAX, and bounded
+        Returns a list of all points bounded horizontally by X_MIN and X_MAX, and bounded
         vertically by Y_MIN and Y_MAX.
         :param x_min:   The left boundary of the range.
         :param x_max:   The right boundary of the range.
         :param y_min:   The bottom boundary of the range.
         :param y_max:   The top boundary of the range.
-        :return:        A list of all Nodes in the range.
+        :return:        A list of (x, y) tuples of all points in the range.
         """
 
-        nodes = []
-
-        def search_helper(node):
-            if node:
-                if x_min <= node.x <= x_max and y_min <= node.y <= y_max:
-                    nodes.append(node)
-                if x_min < node.x:
-                    if y_min < node.y:
-                        search_helper(node.down_left)
-                    if y_max >= node.y:
-                        search_helper(node.up_left)
-                if x_max >= node.x:
-                    if y_min < node.y:
-                        search_helper(node.down_right)
-                    if y_max >= node.y:
-                        search_helper(node.up_right)
-
-        search_helper(self.root)
-        return nodes
+        indices = self._search_indices(x_min, x_max, y_min, y_max)
+        return list(zip(self._xs[indices].tolist(), self._ys[indices].tolist()))
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        n = self.size
+        return {'name': self.name, 'xs': self._xs[:n].copy(), 'ys': self._ys[:n].copy()}
+
+    def __setstate__(self, state):
+        self.name = state['name']
+        if 'root' in state:
+            # Layouts saved before the array store kept their points in a quadtree of Nodes
+            xs, ys = [], []
+            stack = [state['root']]
+            while stack:
+                node = stack.pop()
+                if node is not None:
+                    xs.append(node.x)
+                    ys.append(node.y)
+                    stack.extend((node.up_left, node.up_right, node.down_left, node.down_right))
+            self._init_points(np.array(xs, dtype=np.float32), np.array(ys, dtype=np.float32))
+        else:
+            self._init_points(state['xs'], state['ys'])
 
     def shortest_path(self, source, target):
         """
-        Returns the shortest path from A to B using horizontal and vertical teleports.
-        This method uses a variant of the A* search algorithm.
+        Returns the shortest path from A to B using horizontal and vertical teleports,
+        and makes it the path that the bot is currently taking.
         :param source:  The position to start at.
         :param target:  The destination.
         :return:        A list of all Nodes on the shortest path in order.
         """
 
+        path = self.plan(source, target)
+        config.path = path.copy()
+        return path
+
+    def plan(self, source, target):
+        """
+        Returns the shortest path from A to B using horizontal and vertical teleports
+        without changing the bot's current path, so it can be planned ahead of time.
+        Paths are cached by the cell that SOURCE falls in and by TARGET, so repeated
+        legs of a routine are only planned once.
+        :param source:  The position to start at.
+        :param target:  The destination.
+        :return:        A list of (x, y) positions on the shortest path in order.
+        """
+
+        source, target = tuple(source), tuple(target)
+        cell_size = settings.move_tolerance / 2
+        key = (math.floor(source[0] / cell_size), math.floor(source[1] / cell_size), target,
+               settings.learned_costs)
+        with self.path_cache_lock:
+            if self.path_cache_tolerance != settings.move_tolerance:
+                self.path_cache.clear()
+                self.path_cache_tolerance = settings.move_tolerance
+            entry = self.path_cache.get(key)
+            if entry is not None:
+                self.path_cache.move_to_end(key)
+                self.path_cache_stats['hits'] += 1
+                self.path_cache_stats['saved'] += entry[2]
+                return [source] + entry[0][1:]
+            self.path_cache_stats['misses'] += 1
+
+        graph = self.map_graph
+        if graph is None or not graph.is_fresh(self):
+            self._get_edges()       # Building the graph is not part of the time a hit saves
+        start = time.perf_counter()
+        path = self._plan(source, target)
+        elapsed = time.perf_counter() - start
+
+        reach = 2 * settings.move_tolerance
+        xs, ys = zip(*path)
+        bounds = (min(xs) - reach, max(xs) + reach, min(ys) - reach, max(ys) + reach)
+        with self.path_cache_lock:
+            self.path_cache[key] = (path, bounds, elapsed)
+            if len(self.path_cache) > Layout.PATH_CACHE_SIZE:
+                self.path_cache.popitem(last=False)
+        return path
+
+    def _invalidate_paths(self, x, y):
+        """Forgets every cached path that a new point at (X, Y) might shorten."""
+
+        with self.path_cache_lock:
+            stale = [key for key, (_, (x_min, x_max, y_min, y_max), _) in self.path_cache.items()
+                     if x_min <= x <= x_max and y_min <= y <= y_max]
+            for key in stale:
+                del self.path_cache[key]
+
+    def precompute(self, waypoints):
+        """
+        Plans and caches the path between every pair of consecutive WAYPOINTS, including
+        from the last back to the first.
+        :param waypoints:   A list of (x, y) positions, such as a routine's Points.
+        :return:            None
+        """
+
+        for i, source in enumerate(waypoints):
+            target = waypoints[(i + 1) % len(waypoints)]
+            if source != target:
+                self.plan(source, target)
+
+    def path_cache_report(self):
+        """Returns a one-line summary of how effective the path cache has been."""
+
+        stats = self.path_cache_stats
+        total = stats['hits'] + stats['misses']
+        rate = stats['hits'] / total if total else 0
+        return f"Path cache: {stats['hits']}/{total} hits ({rate:.0%}), " \
+               f"{stats['saved'] * 1000:.1f} ms of planning saved"
+
+    def _plan(self, source, target):
+        """
+        Plans over the platforms and ropes of this Layout's MapGraph if it is up to date
+        and both positions lie on it. Otherwise runs A* over the navigation graph, falling
+        back to the reachable point closest to TARGET if TARGET cannot be reached.
+        """
+
+        tolerance = settings.move_tolerance
+        if utils.distance(source, target) <= tolerance:
+            return [source, target]
+        model = self.costs if settings.learned_costs and self.costs.ready() else None
+        graph = self.map_graph
+        if graph is not None and graph.is_fresh(self):
+            path = graph.plan(source, target, model)
+            if path is not None:
+                return path
+        edges, xs, ys, n = self._get_edges()
+        penalty = Layout.HOP_PENALTY * tolerance
+        if model is None:
+            rate = 1
+
+            def weigh(x0, y0, x1, y1):
+                return math.hypot(x1 - x0, y1 - y0) + penalty
+        else:
+            rate = model.min_rate       # Keeps the heuristic from overestimating travel time
+
+            def weigh(x0, y0, x1, y1):
+                return model.estimate((x0, y0), (x1, y1))
+
+        def remaining(i):
+            return max(0.0, math.hypot(target[0] - xs[i], target[1] - ys[i]) - tolerance)
+
+        def heuristic(i):
+            return remaining(i) * rate
+
+        # SOURCE is not in the graph, so its neighbors are found directly
+        costs = {}
+        edge_to = {}
         fringe = []
-        vertices = [source]
-        distances = [0]
-        edge_to = [0]
-
-        def push_neighbors(index):
-            """
-            Adds possible Nodes that can be reached from POINT (using only one or
-            two teleports) to the fringe. The Nodes that are returned are all closer
-            to TARGET than POINT is.
-            :param index:   The index of the current position.
-            :return:        None
-            """
-
-            point = vertices[index]
-
-            def push_best(nodes):
-                """
-                Pushes the Node closest to TARGET to the fringe.
-                :param nodes:   A list of points to compare.
-                :return:        None
-                """
-
-                if nodes:
-                    points = [tuple(n) for n in nodes]
-                    closest = utils.closest_point(points, target)
-
-                    # Push to the fringe
-                    distance = distances[index] + utils.distance(point, closest)
-                    heuristic = distance + utils.distance(closest, target)
-                    heappush(fringe, (heuristic, len(vertices)))
-
-                    # Update vertex and edge lists to include the new node
-                    vertices.append(closest)
-                    distances.append(distance)
-                    edge_to.append(index)
-
-            x_error = (target[0] - point[0])
-            y_error = (target[1] - point[1])
-            delta = settings.move_tolerance / math.sqrt(2)
-
-            # Push best possible node using horizontal teleport
-            if abs(x_error) > settings.move_tolerance:
-                if x_error > 0:
-                    x_min = point[0] + settings.move_tolerance / 4
-                    x_max = point[0] + settings.move_tolerance * 2
-                else:
-                    x_min = point[0] - settings.move_tolerance * 2
-                    x_max = point[0] - settings.move_tolerance / 4
-                candidates = self.search(x_min,
-                                         x_max,
-                                         point[1] - delta,
-                                         point[1] + delta)
-                push_best(candidates)
-
-            # Push best possible node using vertical teleport
-            if abs(y_error) > settings.move_tolerance:
-                if y_error > 0:
-                    y_min = point[1] + settings.move_tolerance / 4
-                    y_max = 1
-                else:
-                    y_min = 0
-                    y_max = point[1] - settings.move_tolerance / 4
-                candidates = self.search(point[0] - delta,
-                                         point[0] + delta,
-                                         y_min,
-                                         y_max)
-                push_best(candidates)
-
-        # Perform the A* search algorithm
-        i = 0
-        while utils.distance(vertices[i], target) > settings.move_tolerance:
-            push_neighbors(i)
-            if len(fringe) == 0:
+        for j in self._teleport_neighbors(*source).tolist():
+            if j >= n:
+                continue            # Added after the graph was taken
+            cost = weigh(source[0], source[1], xs[j], ys[j])
+            if cost < costs.get(j, math.inf):
+                costs[j] = cost
+                edge_to[j] = None
+                heappush(fringe, (cost + heuristic(j), j))
+
+        closed = set()
+        goal = None
+        closest = None              # The expanded node nearest to TARGET, in case it is unreachable
+        while fringe:
+            _, i = heappop(fringe)
+            if i in closed:
+                continue
+            closed.add(i)
+            distance = remaining(i)
+            if distance == 0:
+                goal = i
                 break
-            i = heappop(fringe)[1]
-
-        # Extract and return shortest path
+            if closest is None or distance < remaining(closest):
+                closest = i
+            for j in edges[i]:
+                if j in closed or j >= n:
+                    continue
+                cost = costs[i] + weigh(xs[i], ys[i], xs[j], ys[j])
+                if cost < costs.get(j, math.inf):
+                    costs[j] = cost
+                    edge_to[j] = i
+                    heappush(fringe, (cost + heuristic(j), j))
+
+        end = goal if goal is not None else closest
+        if end is not None and \
+                utils.distance((xs[end], ys[end]), target) >= utils.distance(source, target):
+            end = None              # Moving towards the graph would not get any closer
         path = [target]
-        while i != 0:
-            path.append(vertices[i])
+        i = end
+        while i is not None:
+            path.append((float(xs[i]), float(ys[i])))
             i = edge_to[i]
-
         path.append(source)
-        path = list(reversed(path))
-        config.path = path.copy()
-        return path
+        return list(reversed(path))
+
+    def _teleport_neighbors(self, x, y):
+        """Returns the indices of all points reachable from (X, Y) with a single teleport."""
+
+        tolerance = settings.move_tolerance
+        delta = tolerance / math.sqrt(2)
+        ranges = (
+            (x + tolerance / 4, x + tolerance * 2, y - delta, y + delta),      # Right
+            (x - tolerance * 2, x - tolerance / 4, y - delta, y + delta),      # Left
+            (x - delta, x + delta, y + tolerance / 4, 1),                      # Down
+            (x - delta, x + delta, 0, y - tolerance / 4)                       # Up
+        )
+        return np.unique(np.concatenate([self._search_indices(*r) for r in ranges]))
+
+    def _get_edges(self):
+        """
+        Returns the navigation graph as a list of each point's neighbors, building it
+        from scratch if there is none yet, if move_tolerance has changed since or if it
+        does not cover every point. The graph is built and published under self.lock so
+        that points added meanwhile are connected to it rather than lost.
+        :return:    The graph, the x and y arrays its indices refer to, and the number of
+                    points it covered when it was returned.
+        """
 
-    def draw(self, image):
+        with self.lock:
+            n = self.size
+            edges = self.edges
+            if edges is None or self.edges_tolerance != settings.move_tolerance or len(edges) != n:
+                edges = [self._teleport_neighbors(self._xs[i], self._ys[i]).tolist() for i in range(n)]
+                self.edges_tolerance = settings.move_tolerance
+                self.edges = edges
+            return edges, self._xs, self._ys, n
+
+    def compact(self, spacing=None):
         """
-        Draws the points in this QuadTree onto IMAGE using in-order traversal.
-        :param image:   The image to draw on.
-        :return:        None
+        Returns a copy of this Layout without the redundant points that long recording
+        sessions accumulate. See Layout._thin for how points are merged.
+        :param spacing:     The largest gap to leave between points along a platform,
+                            defaults to move_tolerance.
+        :return:            A new Layout instance.
         """
 
-        def draw_helper(node):
-            if node:
-                draw_helper(node.up_left)
-                draw_helper(node.down_left)
+        if spacing is None:
+            spacing = settings.move_tolerance
+        n = self.size
+        xs, ys = Layout._thin(self._xs[:n].copy(), self._ys[:n].copy(), spacing)
+        layout = Layout(self.name)
+        layout._init_points(xs, ys)
+        return layout
 
-                center = utils.convert_to_absolute(tuple(node), image)
-                cv2.circle(image, center, 1, (255, 165, 0), -1)
+    @staticmethod
+    def _thin(xs, ys, spacing):
+        """
+        Returns the x and y positions of the points that represent XS and YS after compaction.
+        Points are snapped to rows of TOLERANCE height, and each row is split into runs
+        wherever consecutive points are more than SPACING apart. Every run is replaced by
+        evenly spaced points on its median height that span it at most SPACING apart, so
+        every stretch of platform stays within a teleport of a kept point. Runs of a single
+        point, such as those along ropes, are kept as they are.
+        """
 
-                draw_helper(node.up_right)
-                draw_helper(node.down_right)
+        n = len(xs)
+        if n == 0:
+            return xs, ys
+        rows = np.floor(ys / Layout.TOLERANCE).astype(np.int64)
+        order = np.lexsort((xs, rows))
+        rows, xs, ys = rows[order], xs[order], ys[order]
+        breaks = np.flatnonzero((np.diff(rows) != 0) | (np.diff(xs) > spacing)) + 1
+        starts = np.r_[0, breaks].tolist()
+        ends = np.r_[breaks, n].tolist()
+
+        result_xs, result_ys = [], []
+        for start, end in zip(starts, ends):
+            x_min, x_max = float(xs[start]), float(xs[end-1])
+            y = float(np.median(ys[start:end]))
+            count = int(math.ceil((x_max - x_min) / spacing)) + 1
+            run = np.linspace(x_min, x_max, count) if count > 1 else np.array([x_min])
+            result_xs.append(run)
+            result_ys.append(np.full(len(run), y))
+        return (np.concatenate(result_xs).astype(np.float32),
+                np.concatenate(result_ys).astype(np.float32))
+
+    def extract_map_graph(self):
+        """Returns a MapGraph of the platforms and ropes formed by this Layout's points."""
+
+        n = self.size
+        return MapGraph.extract(self._xs[:n], self._ys[:n])
+
+    def draw(self, image, color=(255, 165, 0)):
+        """
+        Draws the points in this Layout onto IMAGE.
+        :param image:   The image to draw on.
+        :param color:   The color of each point, with as many channels as IMAGE.
+        :return:        None
+        """
 
-        draw_helper(self.root)
+        n = self.size
+        if n == 0:
+            return
+        height, width = image.shape[:2]
+        xs = (self._xs[:n] * width).astype(np.int32)
+        ys = (self._ys[:n] * height).astype(np.int32)
+        for dx, dy in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+            px, py = xs + dx, ys + dy
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            image[py[inside], px[inside]] = color
 
     @staticmethod
     def load(routine):
         """
-        Loads the Layout object associated with ROUTINE. Creates and returns a
-        new Layout if the specified Layout does not exist.
+        Loads the Layout object associated with ROUTINE by reading its snapshot and then
+        replaying the points logged since. Layouts still stored as legacy pickles are
+        converted to the binary format first. Creates and returns a new Layout if the
+        specified Layout does not exist.
         :param routine:     The routine associated with the desired Layout.
         :return:            A Layout instance.
         """
 
         layout_name = splitext(basename(routine))[0]
         target = os.path.join(get_layouts_dir(), layout_name)
-        if isfile(target):
-            print(f" -  Found existing Layout file at '{target}'.")
-            with open(target, 'rb') as file:
-                return pickle.load(file)
+        snapshot = target + SNAPSHOT_EXTENSION
+        if not isfile(snapshot) and isfile(target):
+            migrate_file(target)
+        if isfile(snapshot):
+            print(f" -  Found existing Layout file at '{snapshot}'.")
+            layout = Layout.read(snapshot)
+        else:
+            layout = Layout(layout_name)
+        layout.persisted = layout.size
+
+        log = target + POINT_LOG_EXTENSION
+        if isfile(log):
+            with open(log, 'r+b') as file:
+                data = file.read()
+                torn = len(data) % POINT_RECORD.size
+                if torn:        # Drop a partially written final record so later appends stay aligned
+                    data = data[:-torn]
+                    file.truncate(len(data))
+            points = np.frombuffer(data, dtype='<f4').reshape(-1, 2)
+            for x, y in points.tolist():
+                layout._append(x, y)
+            layout.persisted = layout.size
+            layout.logged = len(points)
+            layout.compacted_size = layout.size
+            print(f" -  Replayed {len(points)} logged point(s) from '{log}'.")
+
+        if isfile(target + MAP_EXTENSION):
+            graph = MapGraph.load(target + MAP_EXTENSION)
+            if graph is not None and graph.is_fresh(layout):
+                layout.map_graph = graph
+        if layout.map_graph is None and layout.size > 0:
+            layout.map_graph = layout.extract_map_graph()
+        layout.costs = CostModel.load(target + COSTS_EXTENSION)
+
+        if not isfile(snapshot):
+            print(f" -  Created new Layout file at '{snapshot}'.")
+            layout.save()
+        return layout
+
+    @staticmethod
+    def read(path):
+        """
+        Reads a Layout snapshot in the binary format described by SNAPSHOT_HEADER. The
+        point arrays are memory-mapped and copied once, so large layouts load quickly.
+        :param path:    The path to the snapshot file.
+        :return:        A Layout instance.
+        """
+
+        with open(path, 'rb') as file:
+            header = file.read(SNAPSHOT_HEADER.size)
+            if len(header) < SNAPSHOT_HEADER.size:
+                raise ValueError(f"'{path}' is too short to be a Layout file")
+            magic, version, name_length, n, num_edges, tolerance = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"'{path}' is not a Layout file")
+            if version > SNAPSHOT_VERSION:
+                raise ValueError(f"'{path}' uses Layout format version {version}, "
+                                 f'only versions up to {SNAPSHOT_VERSION} are supported')
+            name = file.read(name_length).decode('utf-8')
+
+        layout = Layout.__new__(Layout)
+        layout.name = name
+        offset = SNAPSHOT_HEADER.size + _pad(name_length)
+        if n == 0:
+            layout._init_points(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+            return layout
+        points = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(2, n))
+        layout._init_points(points[0], points[1])          # Copies, so the file is not kept open
+        if tolerance > 0:
+            offset += points.nbytes
+            graph = np.memmap(path, dtype='<u4', mode='r', offset=offset, shape=(n + 1 + num_edges,))
+            starts = graph[:n+1].tolist()
+            targets = graph[n+1:].tolist()
+            layout.edges = [targets[starts[i]:starts[i+1]] for i in range(n)]
+            layout.edges_tolerance = tolerance
+            del graph
+        del points
+        return layout
+
+    def write(self, path):
+        """
+        Atomically writes this Layout to PATH in the binary format described by
+        SNAPSHOT_HEADER, including its navigation graph if one has been built.
+        :param path:    The path to the snapshot file.
+        :return:        None
+        """
+
+        # Copy everything under the lock, as the bot may be adding points and edges meanwhile
+        with self.lock:
+            n = self.size
+            xs = self._xs[:n].astype('<f4')
+            ys = self._ys[:n].astype('<f4')
+            edges = self.edges
+            if edges is not None and len(edges) == n and self.edges_tolerance > 0:
+                edges = [list(e) for e in edges]
+                tolerance = self.edges_tolerance
+            else:
+                edges = None
+        name = self.name.encode('utf-8')
+        if edges is not None:
+            counts = np.fromiter((len(e) for e in edges), dtype=np.int64, count=n)
+            starts = np.zeros(n + 1, dtype='<u4')
+            np.cumsum(counts, out=starts[1:])
+            targets = np.fromiter((j for e in edges for j in e), dtype='<u4', count=int(starts[-1]))
         else:
-            print(f" -  Created new Layout file at '{target}'.")
-            new_layout = Layout(layout_name)
-            new_layout.save()
-            return new_layout
+            starts = targets = None
+            tolerance = 0
+        num_edges = 0 if targets is None else len(targets)
+
+        with open(path + '.tmp', 'wb') as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(name),
+                                            n, num_edges, tolerance))
+            file.write(name.ljust(_pad(len(name)), b'\0'))
+            file.write(xs.tobytes())
+            file.write(ys.tobytes())
+            if targets is not None:
+                file.write(starts.tobytes())
+                file.write(targets.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)         # Never leave a half-written snapshot behind
+
+    def flush(self):
+        """
+        Appends every point added since the last flush to this Layout's point log and
+        syncs it to disk, compacting the log into a new snapshot once it grows too long.
+        Costs time proportional to the number of new points only. Also saves any newly
+        recorded movement costs.
+        :return:    None
+        """
+
+        if self.costs.dirty:
+            layouts_dir = get_layouts_dir()
+            if not os.path.exists(layouts_dir):
+                os.makedirs(layouts_dir)
+            self.costs.save(join(layouts_dir, self.name + COSTS_EXTENSION))
+        if self.needs_snapshot:
+            self.save()
+            return
+        n = self.size
+        if n == self.persisted:
+            return
+        layouts_dir = get_layouts_dir()
+        if not os.path.exists(layouts_dir):
+            os.makedirs(layouts_dir)
+        records = np.column_stack((self._xs[self.persisted:n], self._ys[self.persisted:n]))
+        with open(join(layouts_dir, self.name + POINT_LOG_EXTENSION), 'ab') as file:
+            file.write(records.astype('<f4').tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        self.logged += n - self.persisted
+        self.persisted = n
+        if self.logged >= Layout.COMPACT_THRESHOLD:
+            self.save()
 
     @utils.run_if_enabled
     def save(self):
         """
-        Pickles this Layout instance to a file that is named after the routine in which
-        this Layout was generated.
+        Writes a snapshot of this Layout to a file that is named after the routine in which
+        this Layout was generated, then clears its point log.
         :return:    None
         """
 
         layouts_dir = get_layouts_dir()
         if not os.path.exists(layouts_dir):
             os.makedirs(layouts_dir)
-        with open(join(layouts_dir, self.name), 'wb') as file:
-            pickle.dump(self, file)
+        n = self.size
+        path = join(layouts_dir, self.name)
+        self.write(path + SNAPSHOT_EXTENSION)
+        self.map_graph = self.extract_map_graph()
+        self.map_graph.save(path + MAP_EXTENSION)
+        log = path + POINT_LOG_EXTENSION
+        if os.path.exists(log):
+            os.remove(log)
+        self.logged = 0
+        self.persisted = n
+        self.needs_snapshot = False
+
+
+def _pad(length):
+    """Returns LENGTH rounded up to the next multiple of 4 bytes."""
+
+    return (length + 3) & ~3
 
 
 def get_layouts_dir():
@@ -300,3 +763,168 @@ def get_layouts_dir():
     else:
         # Fallback to a default directory if command book is not loaded
         return os.path.join(config.RESOURCES_DIR, 'layouts', 'default')
+
+
+def compact_current(spacing=None):
+    """
+    Replaces config.layout with a compacted copy, carrying over any points that are
+    recorded while compaction runs. Safe to call from a background thread.
+    :param spacing:     See Layout.compact.
+    :return:            The compacted Layout, or None if there is no current Layout or if
+                        a different routine's Layout was loaded while compacting.
+    """
+
+    layout = config.layout
+    if layout is None:
+        return None
+    before = layout.size
+    start = time.perf_counter()
+    compacted = layout.compact(spacing)
+    after = compacted.size
+    with layout.lock:
+        if config.layout is not layout:
+            return None
+        n = layout.size
+        for x, y in zip(layout._xs[before:n].tolist(), layout._ys[before:n].tolist()):
+            compacted._append(x, y)
+        compacted.persisted = after + max(0, layout.persisted - before)
+        compacted.compacted_size = compacted.size
+        compacted.needs_snapshot = True
+        compacted.costs = layout.costs
+        layout.replacement = compacted
+        config.layout = compacted
+    elapsed = time.perf_counter() - start
+    print(f"[~] Compacted layout '{layout.name}' from {before} to {after} points "
+          f"in {elapsed * 1000:.0f} ms")
+    return compacted
+
+
+def compact_file(path, spacing=None, queries=200):
+    """
+    Compacts the Layout file at PATH in place, applying its point log first, and reports
+    the point counts and path planning times before and after.
+    :param path:        The path to a Layout file.
+    :param spacing:     See Layout.compact.
+    :param queries:     The number of random paths to time.
+    :return:            None
+    """
+
+    base = path[:-len(SNAPSHOT_EXTENSION)] if path.endswith(SNAPSHOT_EXTENSION) else path
+    layout = Layout.read(path)
+    log = base + POINT_LOG_EXTENSION
+    if isfile(log):
+        with open(log, 'rb') as file:
+            data = file.read()
+        data = data[:len(data) - len(data) % POINT_RECORD.size]
+        for x, y in np.frombuffer(data, dtype='<f4').reshape(-1, 2).tolist():
+            layout._append(x, y)
+
+    start = time.perf_counter()
+    compacted = layout.compact(spacing)
+    elapsed = time.perf_counter() - start
+    print(f"[~] Compacted '{path}' from {layout.size} to {compacted.size} points "
+          f"in {elapsed * 1000:.0f} ms")
+
+    # Time the same queries between points that both Layouts share
+    points = compacted.points().tolist()
+    if len(points) > 1:
+        rng = np.random.default_rng(0)
+        pairs = [tuple(tuple(points[i]) for i in rng.choice(len(points), 2, replace=False))
+                 for _ in range(queries)]
+        for label, target in (('Before', layout), ('After', compacted)):
+            start = time.perf_counter()
+            target._get_edges()
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            for source, goal in pairs:
+                target._plan(source, goal)
+            mean = (time.perf_counter() - start) / len(pairs)
+            print(f' -  {label}: graph built in {build * 1000:.0f} ms, '
+                  f'{mean * 1000:.2f} ms per path')
+
+    compacted.write(base + SNAPSHOT_EXTENSION)
+    compacted.extract_map_graph().save(base + MAP_EXTENSION)
+    if isfile(log):
+        os.remove(log)
+
+
+def migrate_file(path):
+    """
+    Converts the legacy pickled Layout at PATH to the binary format. The pickle is kept
+    next to the new file with LEGACY_EXTENSION appended, so it is only migrated once.
+    Only migrate Layouts that you created yourself, since unpickling can run arbitrary code.
+    :param path:    The path to the legacy Layout file.
+    :return:        True if the file was migrated, otherwise False.
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            layout = pickle.load(file)
+    except Exception as e:
+        print(f"[WARN] Failed to read legacy Layout file at '{path}': {e}")
+        return False
+    if not isinstance(layout, Layout):
+        print(f"[WARN] '{path}' does not contain a Layout")
+        return False
+    layout.write(path + SNAPSHOT_EXTENSION)
+    os.replace(path, path + LEGACY_EXTENSION)
+    print(f" -  Migrated {layout.size} point(s) from '{path}' to '{path + SNAPSHOT_EXTENSION}'.")
+    return True
+
+
+def migrate(directory):
+    """Migrates every legacy Layout file under DIRECTORY to the binary format."""
+
+    migrated = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = join(root, name)
+            if splitext(name)[1] or isfile(path + SNAPSHOT_EXTENSION):
+                continue        # Legacy Layouts are named after their routine, without an extension
+            if migrate_file(path):
+                migrated += 1
+    print(f'[~] Migrated {migrated} legacy Layout file(s) in \'{directory}\'')
+
+
+#################################
+#              CLI              #
+#################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manages Auto Maple Layout files.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('migrate', help='convert legacy pickled Layouts to the binary format')
+    convert.add_argument('directory', nargs='?', default=join(config.RESOURCES_DIR, 'layouts'),
+                         help='the directory to search for Layouts')
+    compact = sub.add_parser('compact', help='remove redundant points from a Layout file')
+    compact.add_argument('path', help='the Layout file to compact')
+    compact.add_argument('--spacing', type=float,
+                         help='largest gap between points along a platform')
+    compact.add_argument('--queries', type=int, default=200, help='number of paths to time')
+    extract = sub.add_parser('map', help='extract the platforms and ropes of a Layout file')
+    extract.add_argument('path', help='the Layout file to analyze')
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        if not os.path.isdir(args.directory):
+            print(f"[!] No Layouts found at '{args.directory}'")
+            return
+        migrate(args.directory)
+    elif args.command == 'compact':
+        if not os.path.isfile(args.path):
+            print(f"[!] No Layout found at '{args.path}'")
+            return
+        compact_file(args.path, args.spacing, args.queries)
+    elif args.command == 'map':
+        if not os.path.isfile(args.path):
+            print(f"[!] No Layout found at '{args.path}'")
+            return
+        base = args.path[:-len(SNAPSHOT_EXTENSION)] if args.path.endswith(SNAPSHOT_EXTENSION) else args.path
+        graph = Layout.read(args.path).extract_map_graph()
+        graph.save(base + MAP_EXTENSION)
+        kinds = [s.kind for s in graph.segments]
+        print(f"[~] Extracted {kinds.count(PLATFORM)} platform(s), {kinds.count(ROPE)} rope(s) "
+              f"and {len(graph.connections)} connection(s) to '{base + MAP_EXTENSION}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Extracts the structure of a map from the points of a Layout: horizontal platforms, which
+are runs of points at nearly the same height, and vertical ropes or ladders, which are runs
+of points at nearly the same x position. The resulting MapGraph joins a few dozen such
+segments with connections, so paths can be planned over it instead of over every point.
+"""
+
+import os
+import cv2
+import json
+import math
+import heapq
+from bisect import bisect_left, bisect_right
+import numpy as np
+from src.common import settings, utils
+
+
+MAP_EXTENSION = '.map.json'
+FORMAT_VERSION = 1
+
+# Segment kinds
+PLATFORM = 'platform'
+ROPE = 'rope'
+
+MIN_ROPE_POINTS = 3         # Shorter vertical runs are more likely to be jumps than ropes
+HOP_PENALTY = 0.5           # Extra cost of each connection, as a fraction of move_tolerance
+
+
+class Segment:
+    """A horizontal platform or vertical rope running from START to END."""
+
+    __slots__ = ('kind', 'start', 'end')
+
+    def __init__(self, kind, start, end):
+        self.kind = kind
+        self.start = tuple(start)
+        self.end = tuple(end)
+
+    def project(self, position):
+        """Returns the point on this Segment closest to POSITION."""
+
+        if self.kind == PLATFORM:
+            return min(max(position[0], self.start[0]), self.end[0]), self.start[1]
+        return self.start[0], min(max(position[1], self.start[1]), self.end[1])
+
+    def offset(self, position):
+        """Returns how far along this Segment POSITION lies."""
+
+        return position[0] if self.kind == PLATFORM else position[1]
+
+
+class MapGraph:
+    """
+    Segments extracted from a Layout, together with connections between pairs of segments.
+    Each connection leaves one segment at a fixed point and arrives on another at a fixed
+    point, either by teleporting across a gap or by grabbing on to or off of a rope.
+    """
+
+    def __init__(self, segments, connections, size, tolerance):
+        """
+        :param segments:    A list of Segments.
+        :param connections: A list of (a, b, exit, entry) tuples, leaving segment A at the
+                            EXIT position and arriving on segment B at the ENTRY position.
+        :param size:        The number of Layout points these segments were extracted from.
+        :param tolerance:   The move_tolerance they were extracted with.
+        """
+
+        self.segments = segments
+        self.connections = connections
+        self.size = size
+        self.tolerance = tolerance
+
+        # Every connection endpoint on each segment, sorted by how far along it lies
+        self.stops = [[] for _ in segments]
+        for i, (a, b, exit, entry) in enumerate(connections):
+            self.stops[a].append((segments[a].offset(exit), exit, i))
+            self.stops[b].append((segments[b].offset(entry), entry, None))
+        for stops in self.stops:
+            stops.sort(key=lambda stop: stop[0])
+        self.offsets = [[stop[0] for stop in stops] for stops in self.stops]
+
+    @staticmethod
+    def extract(xs, ys, tolerance=None):
+        """
+        Fits platforms and ropes to the points in XS and YS and connects them.
+        :param xs:          The x positions of a Layout's points.
+        :param ys:          The y positions of a Layout's points.
+        :param tolerance:   The move_tolerance to extract with, defaults to the current one.
+        :return:            A new MapGraph.
+        """
+
+        if tolerance is None:
+            tolerance = settings.move_tolerance
+        n = len(xs)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        separation = tolerance / 4     # Larger than the jitter of positions on one platform
+        segments = []
+
+        # Platforms are runs of at least two points within a row, at most TOLERANCE apart
+        loose = np.zeros(n, dtype=bool)
+        for run in _runs(xs, ys, tolerance, separation):
+            if len(run) > 1:
+                y = float(np.median(ys[run]))
+                segments.append(Segment(PLATFORM, (float(xs[run[0]]), y), (float(xs[run[-1]]), y)))
+            else:
+                loose[run] = True
+
+        # Ropes are vertical runs of the remaining points
+        indices = np.flatnonzero(loose)
+        for run in _runs(ys[indices], xs[indices], tolerance, separation):
+            if len(run) >= MIN_ROPE_POINTS:
+                run = indices[run]
+                x = float(np.median(xs[run]))
+                segments.append(Segment(ROPE, (x, float(ys[run[0]])), (x, float(ys[run[-1]]))))
+
+        return MapGraph(segments, _connect(segments, tolerance), n, tolerance)
+
+    def is_fresh(self, layout):
+        """Returns whether this MapGraph still describes LAYOUT at the current move_tolerance."""
+
+        return self.size == layout.size and self.tolerance == settings.move_tolerance
+
+    def locate(self, position):
+        """
+        Returns the index of the Segment closest to POSITION and the closest point on it,
+        or None if no Segment is within move_tolerance.
+        """
+
+        best = None
+        for i, segment in enumerate(self.segments):
+            point = segment.project(position)
+            d = utils.distance(point, position)
+            if d <= self.tolerance and (best is None or d < best[0]):
+                best = (d, i, point)
+        return None if best is None else best[1:]
+
+    def plan(self, source, target, costs=None):
+        """
+        Returns a path from SOURCE to TARGET that follows segments and connections, or None
+        if either position is not on a segment or TARGET cannot be reached.
+        :param source:  The position to start at.
+        :param target:  The destination.
+        :param costs:   A CostModel to weigh moves by travel time, otherwise they are
+                        weighed by distance.
+        :return:        A list of (x, y) positions on the path in order.
+        """
+
+        start = self.locate(source)
+        goal = self.locate(target)
+        if start is None or goal is None:
+            return None
+        if start[0] == goal[0]:
+            return [tuple(source), tuple(target)]
+
+        # Dijkstra over connection endpoints, which are joined to their neighbors along their segment
+        penalty = HOP_PENALTY * self.tolerance
+        if costs is None:
+            def along(p, q):
+                return utils.distance(p, q)
+
+            def hop(p, q):
+                return utils.distance(p, q) + penalty
+        else:
+            along = hop = costs.estimate
+        goal_segment = goal[0]
+        heap = [(0, 0, start[0], tuple(source), None)]
+        previous = {}           # Maps each settled (segment, position) to the one before it
+        counter = 1
+        while heap:
+            cost, _, segment, position, parent = heapq.heappop(heap)
+            node = (segment, position)
+            if node in previous:
+                continue
+            previous[node] = parent
+            if segment == goal_segment:
+                if position == tuple(target):
+                    return self._trace(node, previous)
+                d = along(position, target)
+                heapq.heappush(heap, (cost + d, counter, segment, tuple(target), node))
+                counter += 1
+                continue
+
+            stops = self.stops[segment]
+            offsets = self.offsets[segment]
+            offset = self.segments[segment].offset(position)
+            lo = bisect_left(offsets, offset)
+            hi = bisect_right(offsets, offset)
+            for k in range(lo, hi):
+                connection = stops[k][2]
+                if connection is not None:
+                    _, b, exit, entry = self.connections[connection]
+                    d = hop(exit, entry)
+                    heapq.heappush(heap, (cost + d, counter, b, entry, node))
+                    counter += 1
+            for k in (lo - 1, hi):
+                if 0 <= k < len(stops):
+                    point = stops[k][1]
+                    heapq.heappush(heap, (cost + along(position, point), counter, segment, point, node))
+                    counter += 1
+        return None
+
+    @staticmethod
+    def _trace(node, previous):
+        """Returns the positions leading to NODE, keeping only where the path changes segment."""
+
+        nodes = []
+        while node is not None:
+            nodes.append(node)
+            node = previous[node]
+        nodes.reverse()
+        path = []
+        for i, (segment, position) in enumerate(nodes):
+            if 0 < i < len(nodes) - 1 and nodes[i-1][0] == segment == nodes[i+1][0]:
+                continue
+            if not path or path[-1] != position:
+                path.append(position)
+        return path
+
+    def draw(self, image, platform_color, rope_color):
+        """
+        Draws every Segment onto IMAGE.
+        :param image:           The image to draw on.
+        :param platform_color:  The color of platforms, with as many channels as IMAGE.
+        :param rope_color:      The color of ropes.
+        :return:                None
+        """
+
+        for segment in self.segments:
+            color = platform_color if segment.kind == PLATFORM else rope_color
+            cv2.line(image,
+                     utils.convert_to_absolute(segment.start, image),
+                     utils.convert_to_absolute(segment.end, image),
+                     color, 2)
+
+    def save(self, path):
+        """Writes this MapGraph to PATH as JSON."""
+
+        data = {
+            'version': FORMAT_VERSION,
+            'size': self.size,
+            'tolerance': self.tolerance,
+            'segments': [{'kind': s.kind, 'start': s.start, 'end': s.end} for s in self.segments],
+            'connections': [{'from': a, 'to': b, 'exit': exit, 'entry': entry}
+                            for a, b, exit, entry in self.connections]
+        }
+        with open(path + '.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def load(path):
+        """Reads the MapGraph saved at PATH, or returns None if it cannot be read."""
+
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data['version'] > FORMAT_VERSION:
+                return None
+            segments = [Segment(s['kind'], s['start'], s['end']) for s in data['segments']]
+            connections = [(c['from'], c['to'], tuple(c['exit']), tuple(c['entry']))
+                           for c in data['connections']]
+            return MapGraph(segments, connections, data['size'], data['tolerance'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Failed to read map graph at '{path}': {e}")
+            return None
+
+
+def _runs(primary, secondary, gap, separation):
+    """
+    Groups points into runs along PRIMARY. Points belong to the same row if sorting them
+    along SECONDARY leaves no jump larger than SEPARATION between them, and rows are split
+    wherever consecutive points are more than GAP apart along PRIMARY.
+    :return:    A list of index arrays, each sorted along PRIMARY.
+    """
+
+    if len(primary) == 0:
+        return []
+    order = np.argsort(secondary, kind='stable')
+    rows = np.empty(len(order), dtype=np.int64)
+    rows[order] = np.cumsum(np.r_[0, np.diff(secondary[order]) > separation])
+    order = np.lexsort((primary, rows))
+    breaks = np.flatnonzero((np.diff(rows[order]) != 0) | (np.diff(primary[order]) > gap)) + 1
+    return np.split(order, breaks)
+
+
+def _connect(segments, tolerance):
+    """Returns every connection between SEGMENTS, in both directions."""
+
+    delta = tolerance / math.sqrt(2)
+    reach = 2 * tolerance
+    connections = []
+
+    def link(a, b, p, q):
+        connections.append((a, b, p, q))
+        connections.append((b, a, q, p))
+
+    platforms = [i for i, s in enumerate(segments) if s.kind == PLATFORM]
+    ropes = [i for i, s in enumerate(segments) if s.kind == ROPE]
+    for k, i in enumerate(platforms):
+        a = segments[i]
+        for j in platforms[k+1:]:
+            b = segments[j]
+            if abs(a.start[1] - b.start[1]) <= delta:
+                # Teleport horizontally across a gap between platforms at the same height
+                left, right = (a, b) if a.start[0] < b.start[0] else (b, a)
+                if 0 < right.start[0] - left.end[0] <= reach:
+                    l, r = (i, j) if left is a else (j, i)
+                    link(l, r, left.end, right.start)
+                continue
+
+            # Teleport vertically anywhere the platforms overlap, sampled every REACH
+            lo = max(a.start[0], b.start[0]) - delta
+            hi = min(a.end[0], b.end[0]) + delta
+            if lo > hi:
+                continue
+            lo = max(lo, a.start[0], b.start[0])
+            hi = min(hi, a.end[0], b.end[0])
+            if lo > hi:
+                lo = hi = (lo + hi) / 2
+            count = int(math.ceil((hi - lo) / reach)) + 1
+            for x in np.linspace(lo, hi, count).tolist() if count > 1 else [lo]:
+                link(i, j, a.project((x, 0)), b.project((x, 0)))
+
+    # Grab on to ropes from platforms they cross or end near
+    for i in ropes:
+        rope = segments[i]
+        x = rope.start[0]
+        for j in platforms:
+            platform = segments[j]
+            y = platform.start[1]
+            if platform.start[0] - delta <= x <= platform.end[0] + delta and \
+                    rope.start[1] - tolerance <= y <= rope.end[1] + tolerance:
+                link(j, i, platform.project((x, y)), rope.project((x, y)))
+    return connections
@@ -0,0 +1,96 @@
+"""Plans the path to the next routine Point in the background while the current one runs."""
+
+import threading
+from collections import OrderedDict
+from src.common import config, settings, utils
+
+
+class PathPrefetcher:
+    """
+    A worker thread that plans one path ahead of the bot. The bot requests the path from
+    where the current Point ends to where the next one is, and Move takes it instead of
+    planning synchronously if the player actually started close enough to where it expected.
+    The last few results are kept, so planning the next leg never replaces the current one.
+    """
+
+    MAX_RESULTS = 8
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.request = None         # The (layout, source, target, tolerance) to plan next
+        self.results = OrderedDict()    # Maps each planned (source, target) to its (layout, tolerance, path)
+        self.stats = {'hits': 0, 'misses': 0}
+        self.ready = False
+        self.thread = threading.Thread(target=self._main)
+        self.thread.daemon = True
+
+    def start(self):
+        """Starts this PathPrefetcher's worker thread."""
+
+        self.thread.start()
+
+    def prefetch(self, source, target):
+        """
+        Asks the worker to plan a path from SOURCE to TARGET on the current Layout,
+        replacing any request it has not started yet.
+        :param source:  Where the player is expected to be when the move begins.
+        :param target:  The destination of the move.
+        :return:        None
+        """
+
+        layout = config.layout
+        if layout is None:
+            return
+        request = (layout, tuple(source), tuple(target), settings.move_tolerance)
+        with self.condition:
+            result = self.results.get(request[1:3])
+            if result is not None and result[:2] == (layout, request[3]):
+                return
+            self.request = request
+            self.condition.notify()
+
+    def take(self, source, target):
+        """
+        Returns the prefetched path to TARGET if it was planned on the current Layout from
+        a start within move_tolerance of SOURCE, otherwise None. The path starts at SOURCE.
+        """
+
+        target = tuple(target)
+        with self.condition:
+            results = list(self.results.items())
+        for (start, goal), (layout, tolerance, path) in reversed(results):
+            if layout is config.layout and goal == target and \
+                    tolerance == settings.move_tolerance and \
+                    utils.distance(start, source) <= settings.move_tolerance:
+                self.stats['hits'] += 1
+                return [tuple(source)] + path[1:]
+        self.stats['misses'] += 1
+        return None
+
+    def report(self):
+        """Returns a one-line summary of how often prefetched paths were used."""
+
+        hits = self.stats['hits']
+        total = hits + self.stats['misses']
+        rate = hits / total if total else 0
+        return f'Path prefetch: {hits}/{total} hits ({rate:.0%})'
+
+    def _main(self):
+        self.ready = True
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                request = self.request
+                self.request = None
+            layout, source, target, tolerance = request
+            try:
+                path = layout.plan(source, target)
+            except Exception as e:
+                print(f'[WARN] Failed to prefetch path to {target}: {e}')
+                continue
+            with self.condition:
+                self.results[(source, target)] = (layout, tolerance, path)
+                self.results.move_to_end((source, target))
+                if len(self.results) > PathPrefetcher.MAX_RESULTS:
+                    self.results.popitem(last=False)
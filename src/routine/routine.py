@@ -1,33 +1,47 @@
 """A collection of classes used in the 'machine code' generated by Auto Maple's compiler for each routine."""
 
-from src.common import config, settings, utils
+from src.common import config, settings, utils, stats
 import csv
+import time
+import threading
 from os.path import splitext, basename
 from src.routine.components import Point, Label, Jump, Setting, Command, SYMBOLS
 from src.routine.layout import Layout
+from src.routine.kdtree import KDTree
+from src.routine.cycles import CycleStats
+from src.modules import timeline
 
 
 def update(func):
     """
     Decorator function that updates both the displayed routine and details
-    for all mutative Routine operations.
+    for all mutative Routine operations. Updates from the GUI's own thread are applied
+    immediately, as the Edit tab relies on them, while those from other threads are posted
+    to the GUI so that repeated mutations only redraw once.
     """
 
     def f(self, *args, **kwargs):
         result = func(self, *args, **kwargs)
         if config.gui is not None:
-            config.gui.set_routine(self.display)
-            config.gui.view.details.update_details()
+            if threading.current_thread() is threading.main_thread():
+                self._update_gui()
+            else:
+                config.gui.post('routine', self._update_gui)
         return result
     return f
 
 
 def dirty(func):
-    """Decorator function that sets the dirty bit for mutative Routine operations."""
+    """
+    Decorator function that sets the dirty bit for mutative Routine operations
+    and invalidates the spatial index of Points.
+    """
 
     def f(self, *args, **kwargs):
         result = func(self, *args, **kwargs)
         self.dirty = True
+        self.point_index = None
+        self.version += 1
         return result
     return f
 
@@ -42,6 +56,10 @@ class Routine:
         self.index = 0
         self.sequence = []
         self.display = []       # Updated alongside sequence
+        self.cycle_start = None     # When the current pass through the sequence began
+        self.cycles = None          # CycleStats of the loaded routine file
+        self.point_index = None     # KDTree of every Point's location, rebuilt lazily
+        self.version = 0            # Incremented whenever the sequence changes
 
     @dirty
     @update
@@ -141,6 +159,8 @@ class Routine:
             target.update(**new_kwargs)
             self.display[i] = str(target)
             self.dirty = True
+            self.point_index = None
+            self.version += 1
         except (ValueError, TypeError) as e:
             print(f"\n[!] Found invalid arguments for '{target.__class__.__name__}':")
             print(f"{' ' * 4} -  {e}")
@@ -161,6 +181,66 @@ class Routine:
         """Increments config.seq_index and wraps back to 0 at the end of config.sequence."""
 
         self.index = (self.index + 1) % len(self.sequence)
+        if self.index == 0:
+            now = time.time()
+            if self.cycle_start is not None:
+                timeline.record(timeline.CYCLE, basename(self.path), now - self.cycle_start)
+                stats.increment(stats.CYCLES)
+                if self.cycles is not None:
+                    self.cycles.record(now - self.cycle_start)
+            self.cycle_start = now
+
+    def record_arrival(self, location):
+        """Records how far into the current cycle the Point at LOCATION was reached."""
+
+        if self.cycles is not None and self.cycle_start is not None:
+            self.cycles.arrive(location, time.time() - self.cycle_start)
+
+    def interrupt_cycle(self):
+        """Discards the current cycle, such as when the bot is paused partway through it."""
+
+        self.cycle_start = None
+
+    def _update_gui(self):
+        config.gui.set_routine(self.display)
+        config.gui.view.details.update_details()
+
+    def next_point(self, i):
+        """Returns the first Point after index I, wrapping around the sequence, or None."""
+
+        n = len(self.sequence)
+        for j in range(1, n + 1):
+            c = self.sequence[(i + j) % n]
+            if isinstance(c, Point):
+                return c
+        return None
+
+    def get_point_index(self):
+        """Returns a KDTree mapping each Point's location to its index in the sequence."""
+
+        index = self.point_index
+        if index is None:
+            index = KDTree((c.location, i) for i, c in enumerate(self.sequence)
+                           if isinstance(c, Point))
+            self.point_index = index
+        return index
+
+    def nearest_point(self, position):
+        """
+        Returns the Point closest to POSITION.
+        :param position:    The (x, y) position to search around.
+        :return:            The (sequence index, Point) pair, or None if there are no Points.
+        """
+
+        result = self.get_point_index().nearest(position)
+        if result is not None:
+            i = result[1]
+            return i, self.sequence[i]
+
+    def k_nearest_points(self, position, k):
+        """Returns up to K (sequence index, Point) pairs closest to POSITION, nearest first."""
+
+        return [(i, self.sequence[i]) for _, i, _ in self.get_point_index().k_nearest(position, k)]
 
     def save(self, file_path):
         """Encodes and saves the current Routine at location PATH."""
@@ -182,6 +262,9 @@ class Routine:
 
     def clear(self):
         self.index = 0
+        self.cycle_start = None
+        self.cycles = None
+        config.routine_slow = False
         self.set([])
         self.dirty = False
         self.path = ''
@@ -226,6 +309,15 @@ class Routine:
         self.dirty = False
         self.path = file
         config.layout = Layout.load(file)
+        self.cycles = CycleStats.load(file)
+        # Settings only take effect as the routine runs, so check for one that enables precomputing
+        precompute = settings.precompute_paths
+        for c in self.sequence:
+            if isinstance(c, Setting) and c.key == 'precompute_paths':
+                precompute = c.value
+        if precompute:
+            waypoints = [c.location for c in self.sequence if isinstance(c, Point)]
+            threading.Thread(target=config.layout.precompute, args=(waypoints,), daemon=True).start()
         config.gui.view.status.set_routine(basename(file))
         config.gui.edit.minimap.draw_default()
         print(f" ~  Finished loading routine '{basename(splitext(file)[0])}'.")